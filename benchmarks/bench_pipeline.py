@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from countries import resolve_country_column  # noqa: E402
+from generate_data import generate  # noqa: E402
+from hashing import hash_columns  # noqa: E402
+from ingest import read_csv_columns  # noqa: E402
+from names import normalize_name_column, split_full_names  # noqa: E402
+from phones import normalize_phone_column  # noqa: E402
+from pipeline import dedup_phones, write_hashed  # noqa: E402
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+STAGES = ['parse', 'name_split', 'normalize', 'country', 'phone', 'dedup', 'hash', 'write']
+COLUMNS = ['First Name', 'Last Name', 'Full Name', 'Mobile', 'Country']
+
+
+def run_stages(csv_path, output_path):
+    timings = {}
+
+    def timed(stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    df = timed('parse', read_csv_columns, csv_path, COLUMNS)
+    timed('name_split', split_full_names, df['Full Name'])
+    fn, ln = timed('normalize', lambda: (normalize_name_column(df['First Name']),
+                                         normalize_name_column(df['Last Name'])))
+    iso = timed('country', resolve_country_column, df['Country'])
+    phone = timed('phone', normalize_phone_column, df['Mobile'], iso)
+    data = pd.DataFrame({'phone': phone, 'fn': fn, 'ln': ln, 'country_iso_code': iso})
+    data = timed('dedup', dedup_phones, data)
+    hashed = timed('hash', hash_columns, data)
+    timed('write', write_hashed, hashed, output_path)
+    return timings, len(df), len(data)
+
+
+def benchmark(sizes, repeat, duplicate_rate, workdir):
+    results = []
+    for rows in sizes:
+        csv_path = os.path.join(workdir, f"bench_{rows}.csv")
+        output_path = os.path.join(workdir, f"bench_{rows}_hashed.csv.gz")
+        generate(rows, duplicate_rate).to_csv(csv_path, index=False)
+
+        best = {}
+        for _ in range(repeat):
+            timings, rows_in, rows_out = run_stages(csv_path, output_path)
+            for stage, seconds in timings.items():
+                best[stage] = min(seconds, best.get(stage, seconds))
+        total = sum(best.values())
+        results.append({
+            'rows': rows_in,
+            'rows_out': rows_out,
+            'stages': best,
+            'total': total,
+            'rows_per_sec': rows_in / total if total else None,
+        })
+        print(f"{rows_in:>10} rows  " + "  ".join(f"{s}={best[s]:.3f}s" for s in STAGES) + f"  total={total:.3f}s")
+        os.remove(csv_path)
+        os.remove(output_path)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # A stage regresses when it is slower than the baseline by more than the tolerance.
+    baseline_by_rows = {entry['rows']: entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        base = baseline_by_rows.get(entry['rows'])
+        if base is None:
+            continue
+        for stage in STAGES:
+            old, new = base['stages'].get(stage), entry['stages'].get(stage)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{entry['rows']} rows {stage}: {old:.3f}s -> {new:.3f}s ({new / old:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the cleaning pipeline on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        results = benchmark(args.sizes, args.repeat, args.duplicate_rate, workdir)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'José', 'María', 'François', 'Zoë', 'Björn', 'Łukasz', 'Søren',
+    'Anne-Marie', 'Jean-Luc', "D'Arcy", 'Mohammed', 'Aarav', 'Priya', 'Nguyễn', 'Seán', 'Ömer', 'İsmail',
+    'Chloé', 'Renée', 'Ana Lucía', 'Hans-Peter', 'Giulia', 'Yuki', 'Fatima', 'Olu', 'Wei',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'García', 'Müller', "O'Brien", 'van der Berg', 'de la Cruz', 'Nowak', 'Rossi',
+    'Kowalczyk', 'Sánchez-Ruiz', 'Al-Farsi', 'bin Salman', 'Dubois', 'Østergaard', 'Papadopoulos', 'Kim',
+    'Tanaka', 'Patel', 'Singh', 'MacDonald', 'St. John', 'Nguyen', 'Da Silva', 'Le Roux', 'Öztürk',
+]
+# (messy spellings, calling code, national number length, trunk prefix)
+COUNTRIES = [
+    (['India', 'india', 'INDIA', 'IN', 'IND', 'Indai', ' India '], '91', 10, '0'),
+    (['United States', 'USA', 'U.S.A.', 'us', 'United States of America', 'america'], '1', 10, '1'),
+    (['United Kingdom', 'UK', 'England', 'Great Britain', 'GB', 'united kingdom'], '44', 10, '0'),
+    (['Germany', 'Deutschland', 'DE', 'germany'], '49', 11, '0'),
+    (['France', 'FR', 'france', 'Frnace'], '33', 9, '0'),
+    (['United Arab Emirates', 'UAE', 'AE', 'Emirates'], '971', 9, '0'),
+    (['Brazil', 'Brasil', 'BR'], '55', 11, '0'),
+    (['Singapore', 'SG', 'Singapur'], '65', 8, ''),
+    ([None, '', 'Unknown', 'N/A'], '', 10, ''),
+]
+PHONE_STYLES = ['plain', 'plus', 'double_zero', 'trunk', 'spaced', 'missing']
+
+
+def _phones(national, cc, trunk, styles):
+    numbers = []
+    for digits, style in zip(national, styles):
+        if style == 'plus' and cc:
+            numbers.append(f"+{cc} {digits}")
+        elif style == 'double_zero' and cc:
+            numbers.append(f"00{cc}{digits}")
+        elif style == 'trunk' and trunk:
+            numbers.append(f"{trunk}{digits}")
+        elif style == 'spaced':
+            numbers.append(f"({digits[:3]}) {digits[3:6]}-{digits[6:]}")
+        elif style == 'missing':
+            numbers.append(None)
+        else:
+            numbers.append(digits)
+    return numbers
+
+
+def generate(rows, duplicate_rate=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    unique_rows = max(1, int(rows * (1 - duplicate_rate)))
+
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), unique_rows)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), unique_rows)]
+    country_idx = rng.integers(0, len(COUNTRIES), unique_rows)
+    styles = np.array(PHONE_STYLES, dtype=object)[rng.integers(0, len(PHONE_STYLES), unique_rows)]
+
+    countries = np.empty(unique_rows, dtype=object)
+    phones = np.empty(unique_rows, dtype=object)
+    for i, (spellings, cc, length, trunk) in enumerate(COUNTRIES):
+        mask = country_idx == i
+        count = int(mask.sum())
+        if not count:
+            continue
+        countries[mask] = np.array(spellings, dtype=object)[rng.integers(0, len(spellings), count)]
+        # Leading digit 2-9 keeps numbers clear of trunk and country-code prefixes.
+        leading = rng.integers(2, 10, count)
+        rest = rng.integers(0, 10 ** (length - 1), count, dtype=np.int64)
+        national = [f"{a}{b:0{length - 1}d}" for a, b in zip(leading, rest)]
+        phones[mask] = _phones(national, cc, trunk, styles[mask])
+
+    df = pd.DataFrame({
+        'First Name': first,
+        'Last Name': last,
+        'Full Name': first + ' ' + last,
+        'Mobile': phones,
+        'Country': countries,
+        'Customer ID': np.arange(unique_rows),
+    })
+    if rows > unique_rows:
+        # Duplicates repeat an earlier customer, sometimes with a different name spelling.
+        dupes = df.iloc[rng.integers(0, unique_rows, rows - unique_rows)].copy()
+        dupes['First Name'] = dupes['First Name'].str.upper()
+        df = pd.concat([df, dupes], ignore_index=True)
+        df = df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic customer CSV for benchmarking.")
+    parser.add_argument('output')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.rows, args.duplicate_rate, args.seed).to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,16 @@
 from flask import Flask, redirect, request, render_template_string, url_for, session
+import os
+import sys
 import requests
-import hashlib
-import hmac
 import pandas as pd
 from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.customaudience import CustomAudience
 from facebook_business.adobjects.adaccount import AdAccount
 from flask_session import Session
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+from graph import fetch_all_ad_accounts  # noqa: E402
+
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Required for session management
 app.config['SESSION_TYPE'] = 'filesystem'
@@ -18,40 +21,6 @@ APP_SECRET = "93ca4a4e40e552ed571a7c81f10e66bf" #"7b1f7856ff5f15619772b4c7717a86
 REDIRECT_URI = "https://127.0.0.1:8090/auth/callback"
 SCOPES = "email,public_profile,business_management,ads_management"
 
-# Helper functions
-
-def generate_appsecret_proof(access_token, app_secret):
-    return hmac.new(app_secret.encode("utf-8"), access_token.encode("utf-8"), hashlib.sha256).hexdigest()
-
-def fetch_all_ad_accounts(access_token, app_secret):
-    appsecret_proof = generate_appsecret_proof(access_token, app_secret)
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {
-        "access_token": access_token,
-        "appsecret_proof": appsecret_proof,
-        "fields": "name",
-        "limit": 100
-    }
-    businesses_url = "https://graph.facebook.com/v19.0/me/businesses"
-    biz_response = requests.get(businesses_url, params=params, headers=headers).json()
-    business_list = biz_response.get("data", [])
-
-    all_accounts = []
-    for biz in business_list:
-        business_id = biz["id"]
-        for endpoint in ["owned_ad_accounts", "client_ad_accounts"]:
-            next_url = f"https://graph.facebook.com/v19.0/{business_id}/{endpoint}"
-            while next_url:
-                account_res = requests.get(next_url, params={
-                    "access_token": access_token,
-                    "appsecret_proof": appsecret_proof,
-                    "fields": "name,account_id",
-                    "limit": 100
-                }, headers=headers).json()
-                all_accounts.extend(account_res.get("data", []))
-                next_url = account_res.get("paging", {}).get("next")
-    return all_accounts
-
 HTML_HEAD = """
 <!DOCTYPE html>
 <html lang='en'>
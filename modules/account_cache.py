@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+ACCOUNT_CACHE_PATH = os.environ.get('ACCOUNT_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'account_cache.sqlite3'))
+ACCOUNT_CACHE_TTL_SECONDS = int(os.environ.get('ACCOUNT_CACHE_TTL_SECONDS', 15 * 60))
+# Older than this, a listing is not worth showing even while a refresh runs.
+ACCOUNT_CACHE_MAX_STALE_SECONDS = int(os.environ.get('ACCOUNT_CACHE_MAX_STALE_SECONDS', 7 * 24 * 60 * 60))
+
+
+class AccountCache:
+    """Ad-account listings per Facebook user, served stale while a background refresh runs."""
+
+    def __init__(self, path=ACCOUNT_CACHE_PATH, ttl=ACCOUNT_CACHE_TTL_SECONDS,
+                 max_stale=ACCOUNT_CACHE_MAX_STALE_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS accounts "
+                         "(user_id TEXT PRIMARY KEY, accounts TEXT NOT NULL, fetched REAL NOT NULL)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _read(self, user_id):
+        with self._lock:
+            row = self._connection().execute("SELECT accounts, fetched FROM accounts WHERE user_id = ?",
+                                              (user_id,)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def _write(self, user_id, accounts):
+        fetched = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO accounts (user_id, accounts, fetched) VALUES (?, ?, ?)",
+                         (user_id, json.dumps(accounts), fetched))
+            conn.commit()
+        return fetched
+
+    def refresh(self, user_id, loader):
+        accounts = loader()
+        return accounts, self._write(user_id, accounts)
+
+    def _refresh_in_background(self, user_id, loader):
+        with self._lock:
+            if user_id in self._refreshing:
+                return
+            self._refreshing.add(user_id)
+
+        def run():
+            try:
+                self.refresh(user_id, loader)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(user_id)
+
+        threading.Thread(target=run, daemon=True, name='account-refresh').start()
+
+    def get(self, user_id, loader, force=False):
+        # Returns (accounts, fetched timestamp). loader() crawls the Business graph.
+        accounts, fetched = (None, None) if force else self._read(user_id)
+        if accounts is None:
+            return self.refresh(user_id, loader)
+        age = time.time() - fetched
+        if age > self.max_stale:
+            return self.refresh(user_id, loader)
+        if age > self.ttl:
+            self._refresh_in_background(user_id, loader)
+        return accounts, fetched
+
+
+_account_cache = None
+
+
+def get_account_cache():
+    global _account_cache
+    if _account_cache is None:
+        _account_cache = AccountCache()
+    return _account_cache
@@ -1,14 +1,23 @@
 from flask import Blueprint, redirect, request, render_template_string, url_for, session
+from markupsafe import escape
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 import requests
-import hashlib
-import hmac
 import pandas as pd
 from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.customaudience import CustomAudience
-from facebook_business.adobjects.adaccount import AdAccount
 
 from flask_session import Session
 
+from account_cache import get_account_cache
+from audience_index import AUDIENCE_WORKERS, audience_key, get_audience_index, name_filter
+from graph import GRAPH_PAGE_LIMIT, fetch_all_ad_accounts, fetch_user_id, graph_batch
+from ledger import get_ledger
+from uploader import upload_in_batches
+
 fb_blueprint = Blueprint('fb', __name__)
 
 APP_ID = "706446295357865"
@@ -16,37 +25,6 @@ APP_SECRET = "93ca4a4e40e552ed571a7c81f10e66bf"
 REDIRECT_URI = "https://127.0.0.1:8090/auth/callback"
 SCOPES = "email,public_profile,business_management,ads_management"
 
-def generate_appsecret_proof(access_token, app_secret):
-    return hmac.new(app_secret.encode("utf-8"), access_token.encode("utf-8"), hashlib.sha256).hexdigest()
-
-def fetch_all_ad_accounts(access_token, app_secret):
-    appsecret_proof = generate_appsecret_proof(access_token, app_secret)
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {
-        "access_token": access_token,
-        "appsecret_proof": appsecret_proof,
-        "fields": "name",
-        "limit": 100
-    }
-    businesses_url = "https://graph.facebook.com/v19.0/me/businesses"
-    biz_response = requests.get(businesses_url, params=params, headers=headers).json()
-    business_list = biz_response.get("data", [])
-    all_accounts = []
-    for biz in business_list:
-        business_id = biz["id"]
-        for endpoint in ["owned_ad_accounts", "client_ad_accounts"]:
-            next_url = f"https://graph.facebook.com/v19.0/{business_id}/{endpoint}"
-            while next_url:
-                account_res = requests.get(next_url, params={
-                    "access_token": access_token,
-                    "appsecret_proof": appsecret_proof,
-                    "fields": "name,account_id",
-                    "limit": 100
-                }, headers=headers).json()
-                all_accounts.extend(account_res.get("data", []))
-                next_url = account_res.get("paging", {}).get("next")
-    return all_accounts
-
 HTML_HEAD = """
 <!DOCTYPE html>
 <html lang='en'>
@@ -92,6 +70,53 @@ HTML_HEAD = """
 <body>
 """
 
+BRAND_PICKER_HTML = HTML_HEAD + """
+<div class='container'>
+    <div class='card p-4'>
+        <div class='d-flex justify-content-between align-items-start mb-3'>
+            <h4>Create Custom Audience</h4>
+            <form method='post' action='/refresh_accounts'>
+                <button type='submit' class='btn btn-outline-secondary btn-sm'>Refresh accounts</button>
+            </form>
+        </div>
+        <p class='text-muted small'>Accounts as of {{ fetched }}.</p>
+        <form method='post' action='/create_audience'>
+            <div class='mb-3'>
+                <label>Select Brands:</label>
+                <input type='text' class='form-control mb-2' id='searchBox' placeholder='Search brands...'>
+                <div class='scroll-box' id='brandsContainer'>
+                    {% for name in account_names %}
+                        <div class='form-check brand-entry'>
+                            <input class='form-check-input' type='checkbox' name='brand_name' value='{{ name }}'>
+                            <label class='form-check-label'>{{ name }}</label>
+                        </div>
+                    {% endfor %}
+                </div>
+            </div>
+            <script>
+            document.getElementById('searchBox').addEventListener('input', function() {
+                let filter = this.value.toLowerCase();
+                let entries = document.querySelectorAll('.brand-entry');
+                entries.forEach(function(entry) {
+                    let label = entry.querySelector('label').textContent.toLowerCase();
+                    entry.style.display = label.includes(filter) ? '' : 'none';
+                });
+            });
+            </script>
+
+            <div class='mb-3'>
+                <label>Audience Title:</label>
+                <input type='text' class='form-control' name='audience_name' required>
+            </div>
+            <button type='submit' class='btn btn-primary w-100'>Create Custom Audience</button>
+        </form>
+        <hr>
+        <a href='/upload_data' class='btn btn-secondary w-100 mt-3'>Go to Upload Hashed Data</a>
+    </div>
+</div>
+</body></html>
+"""
+
 @fb_blueprint.route("/")
 def home():
     return HTML_HEAD + """
@@ -130,7 +155,25 @@ def facebook_callback():
         return f"Error getting access token: {data}", 400
 
     session['access_token'] = access_token
-    accounts_data = fetch_all_ad_accounts(access_token, APP_SECRET)
+    # Cached per Facebook user, outside the session, so a repeat login skips the Business graph crawl.
+    user_id = fetch_user_id(access_token, APP_SECRET)
+    session['fb_user_id'] = user_id
+    return render_brand_picker(access_token, user_id)
+
+@fb_blueprint.route("/refresh_accounts", methods=["POST"])
+def refresh_accounts():
+    access_token = session.get("access_token")
+    user_id = session.get("fb_user_id")
+    if not access_token or not user_id:
+        return redirect(url_for("fb.home"))
+    return render_brand_picker(access_token, user_id, force=True)
+
+def render_brand_picker(access_token, user_id, force=False):
+    if user_id:
+        accounts_data, fetched = get_account_cache().get(
+            user_id, lambda: fetch_all_ad_accounts(access_token, APP_SECRET), force=force)
+    else:
+        accounts_data, fetched = fetch_all_ad_accounts(access_token, APP_SECRET), time.time()
     ad_account_map = {}
     for acct in accounts_data:
         account_id = f"act_{acct['account_id']}"
@@ -139,48 +182,105 @@ def facebook_callback():
         ad_account_map[display_name] = account_id
     session['ad_account_map'] = ad_account_map
 
-    form_html = HTML_HEAD + """
-    <div class='container'>
-        <div class='card p-4'>
-            <h4 class='mb-3'>Create Custom Audience</h4>
-            <form method='post' action='/create_audience'>
-                <div class='mb-3'>
-                    <label>Select Brands:</label>
-                    <input type='text' class='form-control mb-2' id='searchBox' placeholder='Search brands...'>
-                    <div class='scroll-box' id='brandsContainer'>
-                        {% for name in account_names %}
-                            <div class='form-check brand-entry'>
-                                <input class='form-check-input' type='checkbox' name='brand_name' value='{{ name }}'>
-                                <label class='form-check-label'>{{ name }}</label>
-                            </div>
-                        {% endfor %}
-                    </div>
-                </div>
-                <script>
-                document.getElementById('searchBox').addEventListener('input', function() {
-                    let filter = this.value.toLowerCase();
-                    let entries = document.querySelectorAll('.brand-entry');
-                    entries.forEach(function(entry) {
-                        let label = entry.querySelector('label').textContent.toLowerCase();
-                        entry.style.display = label.includes(filter) ? '' : 'none';
-                    });
-                });
-                </script>
+    return render_template_string(BRAND_PICKER_HTML, account_names=ad_account_map.keys(),
+                                  fetched=time.strftime('%Y-%m-%d %H:%M', time.localtime(fetched)))
+
+def ensure_audience(brand, account_id, audience_name):
+    # Returns (result line, audience id) for one brand; the line is HTML, so Graph text is escaped.
+    label = escape(brand)
+    if not account_id:
+        return f"<b>{label}</b>: ❌ Brand not found", None
+    try:
+        audience_id, created = get_audience_index(account_id).lookup_or_create(audience_name, audience_params(brand))
+    except Exception as e:
+        return f"<b>{label}</b>: ❌ Error - {escape(str(e))}", None
+    if created:
+        return f"<b>{label}</b>: ✅ Created new audience (ID: {escape(audience_id)})", audience_id
+    return f"<b>{label}</b>: ⚠️ Audience already exists (ID: {escape(audience_id)})", audience_id
+
+def audience_params(brand):
+    return {
+        'subtype': 'CUSTOM',
+        'description': f'Audience for {brand}',
+        'customer_file_source': 'USER_PROVIDED_ONLY',
+    }
 
-                <div class='mb-3'>
-                    <label>Audience Title:</label>
-                    <input type='text' class='form-control' name='audience_name' required>
-                </div>
-                <button type='submit' class='btn btn-primary w-100'>Create Custom Audience</button>
-            </form>
-            <hr>
-            <a href='/upload_data' class='btn btn-secondary w-100 mt-3'>Go to Upload Hashed Data</a>
-        </div>
-    </div>
-    </body></html>
-    """
+def ensure_audiences(access_token, brand_accounts, audience_name):
+    # brand_accounts is [(brand, account id)]; returns (result line, audience id) per brand, in order.
+    # Lookups and creates each go out as Graph batch calls; brands sharing an account share one audience.
+    accounts = {}
+    for brand, account_id in brand_accounts:
+        if account_id:
+            accounts.setdefault(account_id, []).append(brand)
+
+    found, created, errors, fallback = {}, {}, {}, []
+    lookups = {}
+    for account_id in accounts:
+        audience_id = get_audience_index(account_id).peek(audience_name)
+        if audience_id:
+            found[account_id] = audience_id
+            continue
+        lookups[account_id] = {'method': 'GET', 'relative_url': f"{account_id}/customaudiences?" + urlencode({
+            'fields': 'id,name',
+            'filtering': json.dumps(name_filter(audience_name)),
+            'limit': GRAPH_PAGE_LIMIT,
+        })}
+    for account_id, response in graph_batch(access_token, APP_SECRET, lookups).items():
+        if not response['ok']:
+            errors[account_id] = response['error']
+            continue
+        body = response['body'] or {}
+        matched = next((a for a in body.get('data', []) if audience_key(a['name']) == audience_key(audience_name)),
+                       None)
+        if matched:
+            found[account_id] = matched['id']
+            get_audience_index(account_id).remember(audience_name, matched['id'])
+        elif body.get('paging', {}).get('next'):
+            # Too many near matches for one page; let the account's full index decide.
+            fallback.append(account_id)
+
+    creates = {
+        account_id: {'method': 'POST', 'relative_url': f"{account_id}/customaudiences",
+                     'body': urlencode(dict(audience_params(brands[0]), name=audience_name))}
+        for account_id, brands in accounts.items()
+        if account_id not in found and account_id not in errors and account_id not in fallback
+    }
+    for account_id, response in graph_batch(access_token, APP_SECRET, creates, retry_transport=False).items():
+        if response.get('uncertain'):
+            # The create may have landed; the index re-lists the account before creating again.
+            fallback.append(account_id)
+            continue
+        if not response['ok']:
+            errors[account_id] = response['error']
+            continue
+        created[account_id] = response['body']['id']
+        get_audience_index(account_id).remember(audience_name, created[account_id])
+
+    outcomes = {}
+    if fallback:
+        def ensure_account(account_id):
+            return [(brand, ensure_audience(brand, account_id, audience_name)) for brand in accounts[account_id]]
 
-    return render_template_string(form_html, account_names=ad_account_map.keys())
+        with ThreadPoolExecutor(max_workers=AUDIENCE_WORKERS) as pool:
+            for account_outcomes in pool.map(ensure_account, fallback):
+                outcomes.update(account_outcomes)
+
+    for brand, account_id in brand_accounts:
+        if brand in outcomes:
+            continue
+        label = escape(brand)
+        if not account_id:
+            outcomes[brand] = (f"<b>{label}</b>: ❌ Brand not found", None)
+        elif account_id in errors:
+            outcomes[brand] = (f"<b>{label}</b>: ❌ Error - {escape(errors[account_id])}", None)
+        elif account_id in created and accounts[account_id][0] == brand:
+            outcomes[brand] = (f"<b>{label}</b>: ✅ Created new audience (ID: {escape(created[account_id])})",
+                               created[account_id])
+        else:
+            audience_id = found.get(account_id) or created.get(account_id)
+            outcomes[brand] = (f"<b>{label}</b>: ⚠️ Audience already exists (ID: {escape(audience_id)})",
+                               audience_id)
+    return [outcomes[brand] for brand, _ in brand_accounts]
 
 @fb_blueprint.route("/create_audience", methods=["POST"])
 def create_audience():
@@ -197,33 +297,11 @@ def create_audience():
 
     FacebookAdsApi.init(access_token=access_token, app_id=APP_ID, app_secret=APP_SECRET)
 
-    created_audience_ids = []
-    results = []
-    for brand in brand_names:
-        account_id = ad_account_map.get(brand)
-        if not account_id:
-            results.append(f"<b>{brand}</b>: ❌ Brand not found")
-            continue
+    outcomes = ensure_audiences(access_token, [(brand, ad_account_map.get(brand)) for brand in brand_names],
+                                audience_name)
+    results = [result for result, _ in outcomes]
+    created_audience_ids = [audience_id for _, audience_id in outcomes if audience_id]
 
-        account = AdAccount(account_id)
-        try:
-            existing = account.get_custom_audiences(fields=["id", "name"])
-            matched = next((a for a in existing if a['name'].strip().lower() == audience_name.strip().lower()), None)
-            if matched:
-                results.append(f"<b>{brand}</b>: ⚠️ Audience already exists (ID: {matched['id']})")
-                created_audience_ids.append(matched['id'])
-            else:
-                new_aud = account.create_custom_audience(fields=[], params={
-                    'name': audience_name,
-                    'subtype': 'CUSTOM',
-                    'description': f'Audience for {brand}',
-                    'customer_file_source': 'USER_PROVIDED_ONLY',
-                })
-                results.append(f"<b>{brand}</b>: ✅ Created new audience (ID: {new_aud['id']})")
-                created_audience_ids.append(new_aud['id'])
-        except Exception as e:
-            results.append(f"<b>{brand}</b>: ❌ Error - {str(e)}")
-    
     # Save created audience IDs in session so user can select later
     session['created_audience_ids'] = created_audience_ids
 
@@ -274,27 +352,52 @@ def upload_data():
             if df_clean.empty:
                 return "Uploaded CSV contains no valid data after removing empty rows.", 400
 
-            data_to_upload = df_clean[expected_columns].astype(str).values.tolist()
+            rows = [tuple(row) for row in df_clean[expected_columns].astype(str).values.tolist()]
+
+            # Only members missing from the ledger are sent; the rest were uploaded by an earlier run.
+            ledger = get_ledger()
+            added, removed = ledger.diff(audience_id, rows)
+            if request.form.get('full_upload'):
+                added = list(dict.fromkeys(rows))
+            if not request.form.get('remove_missing'):
+                removed = []
 
             FacebookAdsApi.init(access_token=access_token, app_id=APP_ID, app_secret=APP_SECRET)
 
             audience = CustomAudience(audience_id)
-            response = audience.create_user(
-                fields=[],
-                params={
-                    'payload': {
-                        'schema': expected_columns,
-                        'data': data_to_upload,
-                    }
-                }
+            reports = []
+            if added:
+                report = upload_in_batches(lambda params: audience.create_user(fields=[], params=params),
+                                           expected_columns, added)
+                ledger.record(audience_id, added=report['accepted'])
+                reports.append(('Added', report))
+            if removed:
+                report = upload_in_batches(lambda params: audience.delete_users(fields=[], params=params),
+                                           expected_columns, removed)
+                ledger.record(audience_id, removed=report['accepted'])
+                reports.append(('Removed', report))
+            unchanged = len(set(rows)) - len(added)
+            failed = [dict(failure, action=action) for action, report in reports for failure in report['failed']]
+
+            summary_html = "".join(
+                f"<li>{action}: {report['batches'] - len(report['failed'])} of {report['batches']} batch(es) accepted, "
+                f"received <b>{report['num_received']}</b>, invalid <b>{report['num_invalid_entries']}</b></li>"
+                for action, report in reports
+            ) or "<li>Nothing to send.</li>"
+            failed_html = "".join(
+                f"<li>{failure['action']} batch {failure['batch_seq']} ({failure['rows']} rows): {escape(failure['error'])}</li>"
+                for failure in failed
             )
 
             return HTML_HEAD + f"""
             <div class='container'>
                 <div class='card p-4'>
-                    <h4>Upload Successful!</h4>
-                    <p>Data uploaded to audience ID: <b>{audience_id}</b></p>
-                    <pre>{response}</pre>
+                    <h4>{"Upload Finished With Errors" if failed else "Upload Successful!"}</h4>
+                    <p>Data uploaded to audience ID: <b>{escape(audience_id)}</b></p>
+                    <p>Added: <b>{len(added)}</b> &middot; Removed: <b>{len(removed)}</b> &middot;
+                       Already in audience: <b>{unchanged}</b></p>
+                    <ul>{summary_html}</ul>
+                    {f"<p class='text-danger'>Failed batches will be retried on the next upload:</p><ul>{failed_html}</ul>" if failed else ""}
                     <a href='/fb/upload_data' class='btn btn-primary mt-3'>Upload More Data</a>
                     <a href='/' class='btn btn-secondary mt-3'>Home</a>
                 </div>
@@ -307,7 +410,7 @@ def upload_data():
             <div class='container'>
                 <div class='card p-4'>
                     <h4 class='text-danger'>Upload Failed</h4>
-                    <p>{str(e)}</p>
+                    <p>{escape(str(e))}</p>
                     <a href='/fb/upload_data' class='btn btn-primary mt-3'>Try Again</a>
                     <a href='/' class='btn btn-secondary mt-3'>Home</a>
                 </div>
@@ -336,11 +439,90 @@ def upload_data():
                     <label>Hashed Data CSV File</label>
                     <input type='file' class='form-control' name='data_file' accept='.csv' required>
                 </div>
+                <div class='form-check mb-2'>
+                    <input class='form-check-input' type='checkbox' name='remove_missing' value='1' id='removeMissing'>
+                    <label class='form-check-label' for='removeMissing'>Remove members that are no longer in this file</label>
+                </div>
+                <div class='form-check mb-3'>
+                    <input class='form-check-input' type='checkbox' name='full_upload' value='1' id='fullUpload'>
+                    <label class='form-check-label' for='fullUpload'>Re-send every row, even ones uploaded before</label>
+                </div>
                 <button type='submit' class='btn btn-primary w-100'>Upload Data</button>
             </form>
             <hr>
+            <a href='/audience_status' class='btn btn-outline-primary w-100 mt-3'>Check Audience Status</a>
             <a href='/' class='btn btn-secondary w-100 mt-3'>Back to Home</a>
         </div>
     </div>
     </body></html>
     """
+
+AUDIENCE_STATUS_FIELDS = ("name,approximate_count_lower_bound,approximate_count_upper_bound,"
+                          "operation_status,delivery_status")
+AUDIENCE_ID_RE = re.compile(r"^\d+$")
+
+AUDIENCE_STATUS_HTML = HTML_HEAD + """
+<div class='container'>
+    <div class='card p-4'>
+        <h5>Audience Status</h5>
+        <form method='get' class='d-flex gap-2 mb-3'>
+            <input type='text' class='form-control' name='audience_id' placeholder='Add an audience ID'>
+            <button type='submit' class='btn btn-outline-primary'>Check</button>
+        </form>
+        <table class='table table-sm'>
+            <thead><tr><th>ID</th><th>Name</th><th>Size</th><th>Operation</th><th>Delivery</th></tr></thead>
+            <tbody>
+            {% for row in rows %}
+                {% if row.error %}
+                <tr><td>{{ row.id }}</td><td colspan='4' class='text-danger'>{{ row.error }}</td></tr>
+                {% else %}
+                <tr><td>{{ row.id }}</td><td>{{ row.name }}</td><td>{{ row.size }}</td>
+                    <td>{{ row.operation }}</td><td>{{ row.delivery }}</td></tr>
+                {% endif %}
+            {% else %}
+                <tr><td colspan='5'>No audiences yet.</td></tr>
+            {% endfor %}
+            </tbody>
+        </table>
+        <a href='/upload_data' class='btn btn-primary w-100 mt-3'>Upload Hashed Data To Audience</a>
+    </div>
+</div>
+</body></html>
+"""
+
+@fb_blueprint.route("/audience_status")
+def audience_status():
+    access_token = session.get("access_token")
+    if not access_token:
+        return redirect(url_for("fb.home"))
+
+    audience_ids = list(dict.fromkeys(session.get("created_audience_ids", [])
+                                      + [a.strip() for a in request.args.getlist("audience_id") if a.strip()]))
+    # Only numeric IDs go into a relative_url; anything else is reported back as invalid.
+    valid_ids = [audience_id for audience_id in audience_ids if AUDIENCE_ID_RE.match(audience_id)]
+    # One batch call covers up to 50 audiences instead of a round trip each.
+    responses = graph_batch(access_token, APP_SECRET, {
+        audience_id: {'method': 'GET', 'relative_url': f"{audience_id}?fields={AUDIENCE_STATUS_FIELDS}"}
+        for audience_id in valid_ids
+    })
+
+    rows = []
+    for audience_id in audience_ids:
+        response = responses.get(audience_id)
+        if response is None:
+            rows.append({'id': audience_id, 'error': "Invalid audience ID"})
+            continue
+        if not response['ok']:
+            rows.append({'id': audience_id, 'error': response['error']})
+            continue
+        body = response['body'] or {}
+        rows.append({
+            'id': audience_id,
+            'name': body.get('name', ''),
+            'size': f"{body.get('approximate_count_lower_bound', '?')} - "
+                    f"{body.get('approximate_count_upper_bound', '?')}",
+            'operation': (body.get('operation_status') or {}).get('description', ''),
+            'delivery': (body.get('delivery_status') or {}).get('description', ''),
+        })
+
+    return render_template_string(AUDIENCE_STATUS_HTML, rows=rows)
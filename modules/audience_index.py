@@ -0,0 +1,86 @@
+import threading
+import time
+
+from facebook_business.adobjects.adaccount import AdAccount
+
+AUDIENCE_INDEX_TTL_SECONDS = 60 * 60
+AUDIENCE_PAGE_LIMIT = 500
+AUDIENCE_WORKERS = 8
+AUDIENCE_FIELDS = ['id', 'name']
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def audience_key(name):
+    return name.strip().lower()
+
+
+def name_filter(name):
+    # Graph filtering spec for audiences whose name contains this one; callers still compare keys exactly.
+    return [{'field': 'name', 'operator': 'CONTAIN', 'value': name.strip()}]
+
+
+class AudienceIndex:
+    """Name -> id of the custom audiences in one ad account, fetched once and topped up per name on a miss."""
+
+    def __init__(self, account_id, ttl=AUDIENCE_INDEX_TTL_SECONDS):
+        self.account_id = account_id
+        self.ttl = ttl
+        self.ids = {}
+        self.fetched = None
+        # Held across lookup and create, so two brands on one account cannot create duplicates.
+        self.lock = threading.Lock()
+
+    def _list(self, name=None):
+        params = {'limit': AUDIENCE_PAGE_LIMIT}
+        if name is not None:
+            params['filtering'] = name_filter(name)
+        ids = {}
+        for audience in AdAccount(self.account_id).get_custom_audiences(fields=AUDIENCE_FIELDS, params=params):
+            ids.setdefault(audience_key(audience['name']), audience['id'])
+        return ids
+
+    def _fetch(self):
+        self.ids = self._list()
+        self.fetched = time.time()
+
+    def _lookup(self, name):
+        if self.fetched is None or time.time() - self.fetched > self.ttl:
+            self._fetch()
+            return self.ids.get(audience_key(name))
+        audience_id = self.ids.get(audience_key(name))
+        if audience_id is None:
+            # It may have been created elsewhere since the index was built; ask Graph for just this name.
+            self.ids.update(self._list(name))
+            audience_id = self.ids.get(audience_key(name))
+        return audience_id
+
+    def peek(self, name):
+        # Only answers from a fresh index; a miss here still needs checking against Graph.
+        with self.lock:
+            if self.fetched is None or time.time() - self.fetched > self.ttl:
+                return None
+            return self.ids.get(audience_key(name))
+
+    def remember(self, name, audience_id):
+        with self.lock:
+            self.ids[audience_key(name)] = audience_id
+
+    def lookup_or_create(self, name, params):
+        # Returns (audience id, whether it was created).
+        with self.lock:
+            audience_id = self._lookup(name)
+            if audience_id is not None:
+                return audience_id, False
+            audience = AdAccount(self.account_id).create_custom_audience(fields=[], params=dict(params, name=name))
+            self.ids[audience_key(name)] = audience['id']
+            return audience['id'], True
+
+
+def get_audience_index(account_id):
+    with _indexes_lock:
+        index = _indexes.get(account_id)
+        if index is None:
+            index = _indexes[account_id] = AudienceIndex(account_id)
+        return index
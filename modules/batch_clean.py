@@ -0,0 +1,148 @@
+"""Clean and hash many customer files from the command line, without Flask or the Facebook SDK.
+
+    python batch_clean.py exports/ --mapping mapping.json --output-dir hashed/
+
+The mapping file holds the same fields as the web form: phone_col, country_col, fn_col, ln_col and,
+optionally, name_split.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from names import NAME_SPLIT_PATTERNS
+from pipeline import (PIPELINE_VERSION, PIPELINE_WORKERS, missing_columns, pool_context, process_upload,
+                      read_columns)
+
+INPUT_PATTERNS = ['*.csv', '*.csv.gz', '*.csv.zst', '*.zip', '*.parquet', '*.xlsx', '*.xls']
+MAPPING_FIELDS = ['phone_col', 'country_col', 'fn_col', 'ln_col']
+
+
+def load_mapping(path=None, overrides=None):
+    mapping = {}
+    if path:
+        with open(path) as f:
+            mapping.update(json.load(f))
+    mapping.update({key: value for key, value in (overrides or {}).items() if value})
+    mapping.setdefault('name_split', 'first_last')
+    missing = [field for field in MAPPING_FIELDS if not mapping.get(field)]
+    if missing:
+        raise ValueError(f"Mapping is missing {', '.join(missing)}.")
+    if mapping['fn_col'] == mapping['ln_col'] and mapping['name_split'] not in NAME_SPLIT_PATTERNS:
+        raise ValueError(f"Unknown name split mode '{mapping['name_split']}'.")
+    return {key: mapping[key] for key in MAPPING_FIELDS + ['name_split']}
+
+
+def find_inputs(sources):
+    # Each source is a file, a directory (searched for INPUT_PATTERNS) or a glob.
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            for pattern in INPUT_PATTERNS:
+                paths.extend(glob.glob(os.path.join(source, pattern)))
+        elif os.path.isfile(source):
+            paths.append(source)
+        else:
+            paths.extend(glob.glob(source, recursive=True))
+    return sorted(dict.fromkeys(os.path.abspath(path) for path in paths if os.path.isfile(path)))
+
+
+def output_paths(inputs, output_dir):
+    outputs, used = [], set()
+    for path in inputs:
+        stem = os.path.basename(path).split('.')[0]
+        name, counter = f"{stem}_hashed.csv.gz", 1
+        while name in used:
+            name = f"{stem}_{counter}_hashed.csv.gz"
+            counter += 1
+        used.add(name)
+        outputs.append(os.path.join(output_dir, name))
+    return outputs
+
+
+def clean_file(path, mapping, output_path, workers=1):
+    started = time.perf_counter()
+    entry = {'input': path, 'output': output_path}
+    try:
+        missing = missing_columns(read_columns(path), mapping)
+        if missing:
+            raise ValueError(f"Column '{missing[0]}' not found.")
+        result = process_upload(path, mapping, output_path, workers=workers)
+        entry.update(status='done', rows=result['rows'], stages=result['stages'])
+    except Exception as e:
+        entry.update(status='failed', error=str(e))
+    entry['seconds'] = time.perf_counter() - started
+    return entry
+
+
+def run_batch(inputs, mapping, output_dir, workers=PIPELINE_WORKERS):
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = list(zip(inputs, output_paths(inputs, output_dir)))
+    if len(jobs) <= 1 or workers <= 1:
+        # A single file gets the whole pool for its own partitions instead.
+        return [clean_file(path, mapping, output_path, workers=workers) for path, output_path in jobs]
+
+    entries = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=pool_context()) as pool:
+        futures = {pool.submit(clean_file, path, mapping, output_path): path for path, output_path in jobs}
+        for future in as_completed(futures):
+            entry = future.result()
+            entries[entry['input']] = entry
+            print(f"{entry['status']:>6}  {entry['input']}  {entry.get('rows', entry.get('error'))}", file=sys.stderr)
+    return [entries[path] for path, _ in jobs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize, dedup and hash customer files for Meta audiences.")
+    parser.add_argument('inputs', nargs='+', help="files, directories or glob patterns")
+    parser.add_argument('--mapping', help="JSON file with phone_col, country_col, fn_col, ln_col, name_split")
+    parser.add_argument('--phone-col')
+    parser.add_argument('--country-col')
+    parser.add_argument('--fn-col')
+    parser.add_argument('--ln-col')
+    parser.add_argument('--name-split')
+    parser.add_argument('--output-dir', default='hashed')
+    parser.add_argument('--workers', type=int, default=PIPELINE_WORKERS)
+    parser.add_argument('--summary', help="where to write the run summary (default: OUTPUT_DIR/summary.json)")
+    args = parser.parse_args()
+
+    try:
+        mapping = load_mapping(args.mapping, {
+            'phone_col': args.phone_col,
+            'country_col': args.country_col,
+            'fn_col': args.fn_col,
+            'ln_col': args.ln_col,
+            'name_split': args.name_split,
+        })
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error("No input files found.")
+
+    started = time.perf_counter()
+    files = run_batch(inputs, mapping, args.output_dir, args.workers)
+    summary = {
+        'pipeline_version': PIPELINE_VERSION,
+        'mapping': mapping,
+        'seconds': time.perf_counter() - started,
+        'files': files,
+        'done': sum(entry['status'] == 'done' for entry in files),
+        'failed': sum(entry['status'] == 'failed' for entry in files),
+        'rows': sum(entry.get('rows', 0) for entry in files),
+    }
+    summary_path = args.summary or os.path.join(args.output_dir, 'summary.json')
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"{summary['done']} done, {summary['failed']} failed, {summary['rows']} rows in "
+          f"{summary['seconds']:.1f}s; summary at {summary_path}")
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,13 @@
-from flask import Blueprint, request, render_template_string, session, redirect, url_for, send_file
-import pandas as pd
-import io
-import hashlib
-import pycountry
-from phonenumbers.phonenumberutil import country_code_for_region
-import re
+from flask import Blueprint, request, render_template_string, session, redirect, url_for, jsonify, Response
 import os
-import tempfile
-from unidecode import unidecode
+import uuid
+from export import EXPORT_FORMATS, available_formats, iter_export, iter_raw
+from ingest import read_preview, remove_upload, start_cache_build
+from jobs import finished_job, get_job, submit_job
+from metrics import StageStats, record_job, render_prometheus
+from names import NAME_SPLIT_PATTERNS
+from pipeline import PIPELINE_VERSION, PIPELINE_WORKERS, missing_columns, process_upload, read_columns
+from store import load_result, result_key, result_paths, save_result, save_upload, start_sweeper
 
 csv_blueprint = Blueprint('csv', __name__)
 
@@ -55,7 +55,8 @@ UPLOAD_HTML = BASE_HTML.replace("{{ content }}", """
 <h1 class="mb-4">Upload Customer CSV</h1>
 <form method="post" enctype="multipart/form-data">
   <div class="mb-3">
-    <input type="file" name="file" class="form-control" required>
+    <input type="file" name="file" class="form-control" accept=".csv,.gz,.zst,.zip,.parquet,.xlsx,.xls" required>
+    <div class="form-text">CSV, optionally gzip/zstd/zip compressed, Parquet or Excel.</div>
   </div>
   <button type="submit" class="btn btn-primary">Upload</button>
 </form>
@@ -113,45 +114,108 @@ COLUMN_SELECT_HTML = BASE_HTML.replace("{{ content }}", """
       {% for col in columns %}<option value="{{ col }}">{{ col }}</option>{% endfor %}
     </select>
   </div>
+  <div class="mb-3">
+    <label class="form-label">Full Name Split <span class="text-muted">(when first and last name share a column)</span></label>
+    <select name="name_split" class="form-select">
+      <option value="first_last">First word / last word</option>
+      <option value="first_rest">First word / everything after</option>
+      <option value="particles">First word / last word with particles (van, de, al...)</option>
+    </select>
+  </div>
   <button type="submit" class="btn btn-primary">Clean & Hash Data</button>
 </form>
 """)
 
-def get_country_iso(country_name):
-    try:
-        country = pycountry.countries.get(name=country_name)
-        if not country:
-            country = pycountry.countries.search_fuzzy(country_name)[0]
-        return country.alpha_2
-    except:
-        return ""
-
-def get_country_dialing_code(iso_code):
-    try:
-        return f"+{country_code_for_region(iso_code.upper())}"
-    except:
-        return ""
-
-def hash_value(value):
-    if not value or pd.isna(value):
-        return ""
-    return hashlib.sha256(str(value).strip().lower().encode()).hexdigest()
-
-def normalize_name(name):
-    if isinstance(name, str):
-        name = unidecode(name.lower())
-        name = re.sub(r'[^\w\s]', '', name)
-        name = name.replace(" ", "")
-        return name
-    return ""
-
-def extract_names(name):
-    if isinstance(name, str):
-        parts = name.strip().split()
-        fn = parts[0] if parts else ''
-        ln = parts[-1] if len(parts) > 1 else parts[0] if parts else ''
-        return pd.Series([fn, ln])
-    return pd.Series(['', ''])
+PREVIEW_HTML = BASE_HTML.replace("{{ content }}", """
+<h1>Cleaned & Hashed Data</h1>
+<p class="text-muted">Here's a preview of the first 10 rows of your standardized audience data.</p>
+<div class="table-responsive">
+<table class="table table-sm table-bordered align-middle mb-3">
+    <thead class="table-light">
+    <tr>{% for col in columns %}<th>{{ col }}</th>{% endfor %}</tr>
+    </thead>
+    <tbody>
+    {% for row in preview %}
+    <tr>{% for col in columns %}<td>{{ row[col] }}</td>{% endfor %}</tr>
+    {% endfor %}
+    </tbody>
+</table>
+</div>
+<p>
+  <a class="btn btn-outline-secondary btn-sm" data-bs-toggle="collapse" href="#stageTimings" role="button" aria-expanded="false" aria-controls="stageTimings">
+    Toggle Stage Timings
+  </a>
+</p>
+<div class="collapse" id="stageTimings">
+<div class="table-responsive">
+<table class="table table-sm table-bordered align-middle mb-3">
+    <thead class="table-light">
+    <tr><th>Stage</th><th>Wall (s)</th><th>CPU (s)</th><th>Rows in</th><th>Rows out</th><th>Rows/s</th><th>Memory growth (MB)</th></tr>
+    </thead>
+    <tbody>
+    {% for stage in stages %}
+    <tr>
+      <td>{{ stage.stage }}</td>
+      <td>{{ '%.3f' % stage.wall }}</td>
+      <td>{{ '%.3f' % stage.cpu }}</td>
+      <td>{{ stage.rows_in }}</td>
+      <td>{{ stage.rows_out }}</td>
+      <td>{{ '%.0f' % stage.rows_per_sec if stage.rows_per_sec else '' }}</td>
+      <td>{{ '%.0f' % stage.rss_growth_mb if stage.rss_growth_mb is not none else '' }}</td>
+    </tr>
+    {% endfor %}
+    </tbody>
+</table>
+</div>
+</div>
+<form method="post" action="{{ url_for('csv.download') }}" class="row g-2 align-items-center">
+<div class="col-auto">
+  <select name="format" class="form-select">
+    <option value="csv">CSV</option>
+    <option value="csv.gz">CSV (gzip)</option>
+    {% if 'csv.zst' in formats %}<option value="csv.zst">CSV (zstd)</option>{% endif %}
+    <option value="bin">Binary digests (32-byte FN, LN, PHONE per row)</option>
+  </select>
+</div>
+<div class="col-auto">
+  <button type="submit" class="btn btn-success">Download Hashed CSV</button>
+</div>
+</form>
+<!-- ADD THIS BUTTON -->
+<a href="{{ url_for('fb.facebook_login') }}" class="btn btn-primary mt-3">
+    Proceed to Facebook Audience Management & Upload
+</a>
+""")
+
+PROGRESS_HTML = BASE_HTML.replace("{{ content }}", """
+<h1>Cleaning & Hashing...</h1>
+<p class="text-muted">Your file is being processed. This page updates automatically.</p>
+<ul class="list-group mb-3">
+  <li class="list-group-item d-flex justify-content-between">Rows parsed <span id="parsed">0</span></li>
+  <li class="list-group-item d-flex justify-content-between">Rows normalized <span id="normalized">0</span></li>
+  <li class="list-group-item d-flex justify-content-between">Rows hashed <span id="hashed">0</span></li>
+</ul>
+<p id="jobError" class="text-danger"></p>
+<script>
+  function poll() {
+    fetch("{{ url_for('csv.job_status', job_id=job_id) }}")
+      .then(function(res) { return res.json(); })
+      .then(function(job) {
+        ['parsed', 'normalized', 'hashed'].forEach(function(stage) {
+          document.getElementById(stage).textContent = job.progress ? job.progress[stage] : 0;
+        });
+        if (job.status === 'done') {
+          window.location.reload();
+        } else if (job.status === 'failed' || job.error) {
+          document.getElementById('jobError').textContent = 'Processing failed: ' + job.error;
+        } else {
+          setTimeout(poll, 1000);
+        }
+      });
+  }
+  poll();
+</script>
+""")
 
 @csv_blueprint.route('/', methods=['GET', 'POST'])
 def upload():
@@ -160,26 +224,22 @@ def upload():
         if not file or file.filename == '':
             return "No file uploaded."
 
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, file.filename)
-        base, ext = os.path.splitext(file.filename)
-        counter = 1
-        while os.path.exists(temp_path):
-            temp_path = os.path.join(temp_dir, f"{base}_{counter}{ext}")
-            counter += 1
-
-        file.save(temp_path)
+        # Stored by content hash, so re-uploading the same export reuses the file and its results.
+        start_sweeper()
+        upload_hash, temp_path = save_upload(file.stream, file.filename)
         session['temp_csv_path'] = temp_path
+        session['upload_hash'] = upload_hash
 
         try:
-            df = pd.read_csv(temp_path)
+            columns, preview = read_preview(temp_path)
         except Exception as e:
-            os.remove(temp_path)
+            remove_upload(temp_path)
             session.pop('temp_csv_path', None)
-            return f"Error reading CSV: {e}"
+            session.pop('upload_hash', None)
+            return f"Error reading file: {e}"
 
-        preview = df.head(5).to_dict(orient='records')
-        columns = df.columns.tolist()
+        # The full parse happens once, in the background, while the user picks columns.
+        start_cache_build(temp_path)
         return render_template_string(COLUMN_SELECT_HTML, columns=columns, preview=preview)
 
     return UPLOAD_HTML
@@ -187,100 +247,101 @@ def upload():
 @csv_blueprint.route('/process', methods=['POST'])
 def process():
     temp_path = session.get('temp_csv_path')
-    if not temp_path or not os.path.exists(temp_path):
+    upload_hash = session.get('upload_hash')
+    if not temp_path or not upload_hash or not os.path.exists(temp_path):
         return redirect(url_for('csv.upload'))
 
-    df = pd.read_csv(temp_path)
-
-    phone_col = request.form['phone_col']
-    country_col = request.form['country_col']
-    fn_col = request.form['fn_col']
-    ln_col = request.form['ln_col']
-
-    for col in [phone_col, country_col, fn_col, ln_col]:
-        if col not in df.columns:
-            return f"Column '{col}' not found."
-
-    df = df.rename(columns={phone_col: 'phone', country_col: 'country'})
-
-    if fn_col == ln_col:
-        df[['fn', 'ln']] = df[fn_col].apply(extract_names)
+    mapping = {
+        'phone_col': request.form['phone_col'],
+        'country_col': request.form['country_col'],
+        'fn_col': request.form['fn_col'],
+        'ln_col': request.form['ln_col'],
+        'name_split': request.form.get('name_split', 'first_last'),
+    }
+
+    missing = missing_columns(read_columns(temp_path), mapping)
+    if missing:
+        return f"Column '{missing[0]}' not found."
+    if mapping['fn_col'] == mapping['ln_col'] and mapping['name_split'] not in NAME_SPLIT_PATTERNS:
+        return f"Unknown name split mode '{mapping['name_split']}'."
+
+    key = result_key(upload_hash, mapping, PIPELINE_VERSION)
+    cached = load_result(key)
+    if cached is not None:
+        job_id = finished_job(cached)
     else:
-        df['fn'] = df[fn_col]
-        df['ln'] = df[ln_col]
-
-    df['fn'] = df['fn'].apply(normalize_name)
-    df['ln'] = df['ln'].apply(normalize_name)
-
-    df['phone'] = df['phone'].astype(str).str.replace(r"\D", "", regex=True).str[-10:]
-    df['country_iso_code'] = df['country'].apply(get_country_iso)
-    df['country_code'] = df['country_iso_code'].apply(get_country_dialing_code)
-    df['phone'] = df['country_code'] + df['phone']
-
-    data = df[['phone', 'fn', 'ln', 'country_iso_code']].copy()
-    data.drop_duplicates(subset=['phone'], keep='last', inplace=True)
-
-    hashed_rows = [
-        {
-            "FN": hash_value(row['fn']),
-            "LN": hash_value(row['ln']),
-            "PHONE": hash_value(row['phone'])
-        }
-        for _, row in data.iterrows()
-    ]
-    hashed_df = pd.DataFrame(hashed_rows)
-
-    try:
-        os.remove(temp_path)
-    except:
-        pass
+        job_id = submit_job(run_cleaning_job, temp_path, mapping, key)
     session.pop('temp_csv_path', None)
+    session.pop('upload_hash', None)
+    session['job_id'] = job_id
 
-    output_path = os.path.join(tempfile.gettempdir(), f"hashed_{os.getpid()}.csv")
-    hashed_df.to_csv(output_path, index=False)
-    session['hashed_csv_path'] = output_path
+    return redirect(url_for('csv.job_page', job_id=job_id))
 
-    preview = data.head(10).to_dict(orient="records")
-    columns = data.columns.tolist()
-
-    PREVIEW_HTML = BASE_HTML.replace("{{ content }}", """
-    <h1>Cleaned & Hashed Data</h1>
-    <p class="text-muted">Here's a preview of the first 10 rows of your standardized audience data.</p>
-    <div class="table-responsive">
-    <table class="table table-sm table-bordered align-middle mb-3">
-        <thead class="table-light">
-        <tr>{% for col in columns %}<th>{{ col }}</th>{% endfor %}</tr>
-        </thead>
-        <tbody>
-        {% for row in preview %}
-        <tr>{% for col in columns %}<td>{{ row[col] }}</td>{% endfor %}</tr>
-        {% endfor %}
-        </tbody>
-    </table>
-    </div>
-    <form method="post" action="{{ url_for('csv.download') }}">
-    <button type="submit" class="btn btn-success">Download Hashed CSV</button>
-    </form>
-    <!-- ADD THIS BUTTON -->
-    <a href="{{ url_for('fb.facebook_login') }}" class="btn btn-primary mt-3">
-        Proceed to Facebook Audience Management & Upload
-    </a>
-    """)
-
-
-    return render_template_string(PREVIEW_HTML, columns=columns, preview=preview)
+def run_cleaning_job(temp_path, mapping, key, progress):
+    stats = StageStats()
+    output_path, _ = result_paths(key)
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        result = process_upload(temp_path, mapping, tmp_path, workers=PIPELINE_WORKERS, progress=progress,
+                                stats=stats)
+        os.replace(tmp_path, output_path)
+    except Exception:
+        record_job(stats, 'failed')
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    result['output_path'] = output_path
+    save_result(key, result)
+    record_job(stats, 'done')
+    return result
+
+@csv_blueprint.route('/jobs/<job_id>')
+def job_page(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return redirect(url_for('csv.upload'))
+    if job['status'] == 'done':
+        session['hashed_csv_path'] = job['result']['output_path']
+        return render_template_string(PREVIEW_HTML, columns=job['result']['columns'], preview=job['result']['preview'],
+                                      formats=available_formats(), stages=job['result']['stages'])
+    return render_template_string(PROGRESS_HTML, job_id=job_id)
+
+@csv_blueprint.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify({
+        'id': job['id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'rows': job['result']['rows'] if job['result'] else None,
+        'error': job['error'],
+    })
+
+@csv_blueprint.route('/metrics')
+def metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 @csv_blueprint.route('/download', methods=['POST'])
 def download():
     path = session.get('hashed_csv_path')
     if not path or not os.path.exists(path):
         return redirect(url_for('csv.upload'))
-    return send_file(
-        path,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='hashed_customers.csv'
-    )
+
+    fmt = request.form.get('format', 'csv')
+    if fmt not in available_formats():
+        return f"Unknown export format '{fmt}'."
+    mimetype, download_name = EXPORT_FORMATS[fmt]
+    headers = {'Content-Disposition': f'attachment; filename={download_name}'}
+
+    if fmt == 'csv' and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        # The stored file is gzip already; let the browser decompress it.
+        headers['Content-Encoding'] = 'gzip'
+        return Response(iter_raw(path), mimetype=mimetype, headers=headers)
+    return Response(iter_export(path, fmt), mimetype=mimetype, headers=headers)
 
 
 #---------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,121 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pycountry
+from unidecode import unidecode
+
+# Spellings we keep seeing in customer exports that pycountry doesn't know about.
+COUNTRY_ALIASES = {
+    "usa": "US",
+    "us": "US",
+    "america": "US",
+    "united states of amercia": "US",
+    "unted states": "US",
+    "uk": "GB",
+    "britain": "GB",
+    "great britain": "GB",
+    "england": "GB",
+    "scotland": "GB",
+    "wales": "GB",
+    "northern ireland": "GB",
+    "uae": "AE",
+    "emirates": "AE",
+    "ksa": "SA",
+    "saudi": "SA",
+    "south korea": "KR",
+    "korea": "KR",
+    "north korea": "KP",
+    "russia": "RU",
+    "vietnam": "VN",
+    "iran": "IR",
+    "syria": "SY",
+    "laos": "LA",
+    "bolivia": "BO",
+    "venezuela": "VE",
+    "tanzania": "TZ",
+    "moldova": "MD",
+    "czech republic": "CZ",
+    "ivory coast": "CI",
+    "holland": "NL",
+    "the netherlands": "NL",
+    "hongkong": "HK",
+    "phillipines": "PH",
+    "philipines": "PH",
+    "columbia": "CO",
+    "argentia": "AR",
+    "inida": "IN",
+    "indai": "IN",
+    "pakisthan": "PK",
+    "srilanka": "LK",
+    "newzealand": "NZ",
+    "singapur": "SG",
+    "malasia": "MY",
+    "turkey": "TR",
+    "deutschland": "DE",
+    "brasil": "BR",
+    "burma": "MM",
+    "swaziland": "SZ",
+}
+
+FUZZY_CACHE_SIZE = 4096
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+_alias_index = None
+
+
+def _alias_key(value):
+    # Transliterated first, so "Curacao" and "Curaçao" share a key.
+    key = _PUNCT_RE.sub("", unidecode(str(value)).casefold())
+    return _SPACE_RE.sub(" ", key).strip()
+
+
+def get_alias_index():
+    # Built once per process: every name pycountry knows, keyed the same way as lookups.
+    global _alias_index
+    if _alias_index is None:
+        index = {}
+        for country in pycountry.countries:
+            for attr in ("alpha_2", "alpha_3", "name", "official_name", "common_name"):
+                value = getattr(country, attr, None)
+                if value:
+                    index.setdefault(_alias_key(value), country.alpha_2)
+        for alias, iso in COUNTRY_ALIASES.items():
+            index.setdefault(_alias_key(alias), iso)
+        # ISO 3166-3 ends a former code with its successor's alpha-2, e.g. BUMM (Burma) -> MM.
+        # HH, XX and AA mark countries that split or have no single successor, so those are skipped.
+        for country in pycountry.historic_countries:
+            successor = pycountry.countries.get(alpha_2=country.alpha_4[2:])
+            if successor is None:
+                continue
+            for value in (country.name, country.name.split(",")[0], country.alpha_3):
+                index.setdefault(_alias_key(value), successor.alpha_2)
+        _alias_index = index
+    return _alias_index
+
+
+@lru_cache(maxsize=FUZZY_CACHE_SIZE)
+def _fuzzy_country_iso(query):
+    try:
+        return pycountry.countries.search_fuzzy(query)[0].alpha_2
+    except (LookupError, AttributeError):
+        return ""
+
+
+def resolve_country(country_name):
+    if not isinstance(country_name, str) or not country_name.strip():
+        return ""
+    iso = get_alias_index().get(_alias_key(country_name))
+    if iso is not None:
+        return iso
+    return _fuzzy_country_iso(country_name.strip())
+
+
+def resolve_country_column(series):
+    # Resolve each distinct spelling once, then broadcast back to the rows.
+    codes, uniques = pd.factorize(series)
+    resolved = np.array([resolve_country(value) for value in uniques] + [""], dtype=object)
+    return pd.Series(resolved[codes], index=series.index, dtype=object)
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DEDUP_PARTITIONS = 64
+ROWS_PER_PARTITION = 2000000
+
+
+def partitions_for_rows(estimated_rows):
+    # Small inputs dedup in memory; big ones spill into enough buckets that each fits in RAM.
+    return int(min(DEDUP_PARTITIONS, max(1, -(-estimated_rows // ROWS_PER_PARTITION))))
+
+
+def keep_last_mask(keys):
+    return ~pd.Series(keys).duplicated(keep='last').to_numpy()
+
+
+class KeepLastDeduplicator:
+    """Finds the last row of every key across chunks, spilling to disk by key hash."""
+
+    def __init__(self, partitions=1, spill_dir=None):
+        self.partitions = partitions
+        self.total_rows = 0
+        self._keys = []
+        self._bucket_dir = None
+        if partitions > 1:
+            self._bucket_dir = tempfile.mkdtemp(prefix='dedup_buckets_', dir=spill_dir)
+
+    def _bucket_path(self, bucket):
+        return os.path.join(self._bucket_dir, f"bucket_{bucket}.csv")
+
+    def add(self, keys):
+        keys = pd.Series(keys, dtype=object).reset_index(drop=True)
+        rows = np.arange(self.total_rows, self.total_rows + len(keys), dtype=np.int64)
+        self.total_rows += len(keys)
+        if self._bucket_dir is None:
+            self._keys.append(keys)
+            return
+
+        buckets = pd.util.hash_pandas_object(keys, index=False).to_numpy() % self.partitions
+        spill = pd.DataFrame({'key': keys, 'row': rows})
+        # Rows are appended in source order, so keep='last' inside a bucket is keep='last' overall.
+        for bucket, positions in spill.groupby(buckets, sort=False).indices.items():
+            path = self._bucket_path(bucket)
+            spill.iloc[positions].to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+    def keep_mask(self):
+        if self._bucket_dir is None:
+            if not self._keys:
+                return np.zeros(0, dtype=bool)
+            return keep_last_mask(pd.concat(self._keys, ignore_index=True))
+
+        keep = np.zeros(self.total_rows, dtype=bool)
+        for bucket in range(self.partitions):
+            path = self._bucket_path(bucket)
+            if not os.path.exists(path):
+                continue
+            spill = pd.read_csv(path, dtype={'key': str, 'row': np.int64}, na_filter=False)
+            keep[spill['row'].to_numpy()[keep_last_mask(spill['key'])]] = True
+            os.remove(path)
+        return keep
+
+    def close(self):
+        if self._bucket_dir is not None:
+            shutil.rmtree(self._bucket_dir, ignore_errors=True)
+            self._bucket_dir = None
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import threading
+import time
+
+DIGEST_CACHE_PATH = os.environ.get('DIGEST_CACHE_PATH')
+DIGEST_CACHE_MAX_ENTRIES = int(os.environ.get('DIGEST_CACHE_MAX_ENTRIES', 20000000))
+SQLITE_BATCH = 900
+SETUP_RETRIES = 20
+
+
+class DigestCache:
+    """On-disk map of normalized value -> SHA-256 digest, evicting least recently used entries."""
+
+    def __init__(self, path, max_entries=DIGEST_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # sqlite connections must not cross a fork, so pool workers open their own.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            for attempt in range(SETUP_RETRIES):
+                try:
+                    self._setup(conn)
+                    break
+                except sqlite3.OperationalError:
+                    # Several pool workers may open a new cache file at once; switching it to WAL
+                    # can report "locked" without waiting on the busy timeout.
+                    conn.rollback()
+                    if attempt == SETUP_RETRIES - 1:
+                        raise
+                    time.sleep(0.05 * (attempt + 1))
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _setup(self, conn):
+        # journal_mode is stored in the file, so only the first opener has to change it.
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("CREATE TABLE IF NOT EXISTS digests "
+                     "(value TEXT PRIMARY KEY, digest BLOB NOT NULL, last_used REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        # The entry count is kept alongside the hit counters, so eviction never has to scan the table.
+        conn.execute("INSERT OR IGNORE INTO stats (name, count) SELECT 'entries', COUNT(*) FROM digests "
+                     "WHERE NOT EXISTS (SELECT 1 FROM stats WHERE name = 'entries')")
+        conn.commit()
+
+    def get_many(self, values):
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(values), SQLITE_BATCH):
+                batch = values[start:start + SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT value, digest FROM digests WHERE value IN ({placeholders})", batch)
+                found.update((value, bytes(digest)) for value, digest in rows)
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE digests SET last_used = ? WHERE value = ?", ((now, v) for v in found))
+            hits, misses = len(found), len(values) - len(found)
+            self.hits += hits
+            self.misses += misses
+            conn.executemany("INSERT INTO stats (name, count) VALUES (?, ?) "
+                             "ON CONFLICT(name) DO UPDATE SET count = count + excluded.count",
+                             [('hits', hits), ('misses', misses)])
+            conn.commit()
+        return found
+
+    def put_many(self, digests):
+        if not digests:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            before = conn.total_changes
+            # A value always hashes to the same digest, so one already stored is left as it is.
+            conn.executemany("INSERT OR IGNORE INTO digests (value, digest, last_used) VALUES (?, ?, ?)",
+                             ((value, digest, now) for value, digest in digests.items()))
+            added = conn.total_changes - before
+            conn.execute("UPDATE stats SET count = count + ? WHERE name = 'entries'", (added,))
+            entries = conn.execute("SELECT count FROM stats WHERE name = 'entries'").fetchone()[0]
+            excess = entries - self.max_entries
+            if excess > 0:
+                removed = conn.execute("DELETE FROM digests WHERE value IN "
+                                       "(SELECT value FROM digests ORDER BY last_used LIMIT ?)", (excess,)).rowcount
+                conn.execute("UPDATE stats SET count = count - ? WHERE name = 'entries'", (removed,))
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            totals = dict(self._connection().execute("SELECT name, count FROM stats"))
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'total_hits': totals.get('hits', 0),
+            'total_misses': totals.get('misses', 0),
+            'entries': totals.get('entries', 0),
+        }
+
+
+_digest_cache = None
+
+
+def get_digest_cache():
+    global _digest_cache
+    if _digest_cache is None and DIGEST_CACHE_PATH:
+        _digest_cache = DigestCache(DIGEST_CACHE_PATH)
+    return _digest_cache
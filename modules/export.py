@@ -0,0 +1,77 @@
+import gzip
+import io
+
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+STREAM_BLOCK_BYTES = 256 * 1024
+BINARY_CHUNK_ROWS = 100000
+DIGEST_BYTES = 32
+
+# format -> (mimetype, download name)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'hashed_customers.csv'),
+    'csv.gz': ('application/gzip', 'hashed_customers.csv.gz'),
+    'csv.zst': ('application/zstd', 'hashed_customers.csv.zst'),
+    'bin': ('application/octet-stream', 'hashed_customers.bin'),
+}
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'csv.zst' or zstandard is not None]
+
+
+def _read_blocks(fileobj, block_bytes=STREAM_BLOCK_BYTES):
+    while True:
+        block = fileobj.read(block_bytes)
+        if not block:
+            return
+        yield block
+
+
+def iter_raw(path):
+    # The stored result is already gzip, so this is a straight pass-through.
+    with open(path, 'rb') as f:
+        yield from _read_blocks(f)
+
+
+def iter_csv(path):
+    with gzip.open(path, 'rb') as f:
+        yield from _read_blocks(f)
+
+
+def iter_zstd(path, level=3):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for block in iter_csv(path):
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_binary(path, chunk_rows=BINARY_CHUNK_ROWS):
+    # Fixed-width records: FN, LN, PHONE as raw 32-byte SHA-256 digests, all zeros for empty values.
+    empty = bytes(DIGEST_BYTES)
+    for chunk in pd.read_csv(path, dtype=str, na_filter=False, chunksize=chunk_rows):
+        buf = io.BytesIO()
+        for fn, ln, phone in zip(chunk['FN'], chunk['LN'], chunk['PHONE']):
+            buf.write(bytes.fromhex(fn) if fn else empty)
+            buf.write(bytes.fromhex(ln) if ln else empty)
+            buf.write(bytes.fromhex(phone) if phone else empty)
+        yield buf.getvalue()
+
+
+def iter_export(path, fmt):
+    if fmt == 'csv.gz':
+        return iter_raw(path)
+    if fmt == 'csv.zst':
+        if zstandard is None:
+            raise ValueError("zstd export needs the zstandard package")
+        return iter_zstd(path)
+    if fmt == 'bin':
+        return iter_binary(path)
+    return iter_csv(path)
@@ -0,0 +1,156 @@
+import hashlib
+import hmac
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GRAPH_URL = "https://graph.facebook.com/v19.0"
+GRAPH_PAGE_LIMIT = 500
+DISCOVERY_WORKERS = 16
+ACCOUNT_EDGES = ["owned_ad_accounts", "client_ad_accounts"]
+
+GRAPH_BATCH_SIZE = 50  # Graph API limit per batch call
+GRAPH_BATCH_RETRIES = 4
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+
+# Throttling and temporary errors; anything else is a bad request and retrying will not help.
+TRANSIENT_ERROR_CODES = {1, 2, 4, 17, 32, 341, 613, 80003, 80004}
+
+_session = None
+
+
+def generate_appsecret_proof(access_token, app_secret):
+    return hmac.new(app_secret.encode("utf-8"), access_token.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def get_graph_session():
+    # One keep-alive pool shared by every Graph call, sized for the discovery fan-out.
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DISCOVERY_WORKERS, pool_maxsize=DISCOVERY_WORKERS)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
+def fetch_pages(url, params, headers=None):
+    # The paging.next URL already carries the cursor and every query parameter.
+    session = get_graph_session()
+    results = []
+    response = session.get(url, params=params, headers=headers).json()
+    while True:
+        results.extend(response.get("data", []))
+        next_url = response.get("paging", {}).get("next")
+        if not next_url:
+            return results
+        response = session.get(next_url, headers=headers).json()
+
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    # Full jitter, so parallel workers throttled together do not retry in lockstep.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _parse_sub_response(response):
+    # A null entry means Graph did not get to that sub-request before the batch timed out.
+    if response is None:
+        return {'ok': False, 'transient': True, 'code': None, 'body': None, 'error': "not processed"}
+    try:
+        body = json.loads(response.get('body') or 'null')
+    except ValueError:
+        body = response.get('body')
+    code = response.get('code')
+    if code == 200:
+        return {'ok': True, 'transient': False, 'code': code, 'body': body, 'error': None}
+    error = body.get('error', {}) if isinstance(body, dict) else {}
+    transient = (code or 0) >= 500 or error.get('is_transient') or error.get('code') in TRANSIENT_ERROR_CODES
+    return {'ok': False, 'transient': bool(transient), 'code': code, 'body': body,
+            'error': error.get('message') or f"HTTP {code}"}
+
+
+def _send_batch(access_token, appsecret_proof, items, retry_transport=True):
+    batch = [request for _, request in items]
+    try:
+        responses = get_graph_session().post(GRAPH_URL, data={
+            'access_token': access_token,
+            'appsecret_proof': appsecret_proof,
+            'include_headers': 'false',
+            'batch': json.dumps(batch),
+        }).json()
+    except (requests.RequestException, ValueError) as e:
+        # The call may still have been carried out, so only callers whose requests are safe to repeat retry it.
+        return {key: {'ok': False, 'transient': retry_transport, 'uncertain': True, 'code': None, 'body': None,
+                      'error': str(e)} for key, _ in items}
+    if not isinstance(responses, list):
+        # The whole call was rejected, e.g. throttled or a bad token.
+        error = responses.get('error', {}) if isinstance(responses, dict) else {}
+        transient = error.get('code') in TRANSIENT_ERROR_CODES or bool(error.get('is_transient'))
+        failure = {'ok': False, 'transient': transient, 'code': None, 'body': responses,
+                   'error': error.get('message') or "batch request failed"}
+        return {key: dict(failure) for key, _ in items}
+    return {key: _parse_sub_response(response) for (key, _), response in zip(items, responses)}
+
+
+def graph_batch(access_token, app_secret, requests_by_key, retries=GRAPH_BATCH_RETRIES, workers=DISCOVERY_WORKERS,
+                retry_transport=True):
+    # requests_by_key maps any caller key (e.g. a brand) to {'method', 'relative_url'[, 'body']}.
+    # Sub-requests go out 50 per call; only the ones that failed transiently are sent again.
+    # Pass retry_transport=False for non-idempotent requests such as creates: after a timeout or dropped
+    # connection the result is marked 'uncertain' instead, and the caller checks before sending it again.
+    appsecret_proof = generate_appsecret_proof(access_token, app_secret)
+    results = {}
+    pending = list(requests_by_key.items())
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff_delay(attempt - 1))
+        chunks = [pending[start:start + GRAPH_BATCH_SIZE] for start in range(0, len(pending), GRAPH_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as pool:
+            send = partial(_send_batch, access_token, appsecret_proof, retry_transport=retry_transport)
+            for chunk_results in pool.map(send, chunks):
+                results.update(chunk_results)
+        pending = [(key, request) for key, request in pending if results[key]['transient']]
+        if not pending:
+            break
+    return results
+
+
+def fetch_user_id(access_token, app_secret):
+    params = {
+        "access_token": access_token,
+        "appsecret_proof": generate_appsecret_proof(access_token, app_secret),
+        "fields": "id",
+    }
+    return get_graph_session().get(f"{GRAPH_URL}/me", params=params).json().get("id")
+
+
+def fetch_all_ad_accounts(access_token, app_secret, workers=DISCOVERY_WORKERS):
+    appsecret_proof = generate_appsecret_proof(access_token, app_secret)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    params = {
+        "access_token": access_token,
+        "appsecret_proof": appsecret_proof,
+        "limit": GRAPH_PAGE_LIMIT,
+    }
+    business_list = fetch_pages(f"{GRAPH_URL}/me/businesses", dict(params, fields="name"), headers)
+
+    edges = [(biz["id"], endpoint) for biz in business_list for endpoint in ACCOUNT_EDGES]
+    if not edges:
+        return []
+
+    def fetch_edge(edge):
+        business_id, endpoint = edge
+        return fetch_pages(f"{GRAPH_URL}/{business_id}/{endpoint}", dict(params, fields="name,account_id"), headers)
+
+    # map() keeps business and edge order, so the list matches a serial crawl.
+    all_accounts = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(edges))) as pool:
+        for accounts in pool.map(fetch_edge, edges):
+            all_accounts.extend(accounts)
+    return all_accounts
@@ -0,0 +1,292 @@
+import gzip
+import os
+import threading
+import zipfile
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pa_csv = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PREVIEW_ROWS = 5
+CACHE_CHUNK_ROWS = 250000
+CACHE_BLOCK_BYTES = 16 * 1024 * 1024
+
+# 'pyarrow' parses with all cores; 'c' is the pandas parser.
+CSV_ENGINE = os.environ.get('CSV_ENGINE', 'pyarrow' if pa_csv is not None else 'c')
+
+# pandas' default NA strings, so both engines agree on what counts as missing.
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+             '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+# Used when a compressed file does not record its uncompressed size.
+COMPRESSION_RATIO_ESTIMATE = 5
+
+_cache_builds = {}
+_cache_lock = threading.Lock()
+
+
+def detect_format(path):
+    # By content, not extension: uploads are stored under their content hash.
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if head.startswith(b'\x28\xb5\x2f\xfd'):
+        return 'zstd'
+    if head.startswith(b'PAR1'):
+        return 'parquet'
+    if head.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'excel'
+    if head.startswith(b'PK\x03\x04'):
+        with zipfile.ZipFile(path) as archive:
+            if any(name.startswith('xl/') for name in archive.namelist()):
+                return 'excel'
+        return 'zip'
+    return 'csv'
+
+
+def _require_parquet():
+    if pq is None:
+        raise ValueError("parquet input needs the pyarrow package")
+
+
+def _zip_member(archive):
+    members = [info for info in archive.infolist() if not info.is_dir()]
+    if not members:
+        raise ValueError("The zip archive is empty.")
+    return next((info for info in members if info.filename.lower().endswith('.csv')), members[0])
+
+
+def open_csv(path, fmt=None):
+    # A binary stream of CSV text; compressed inputs are decompressed as they are read.
+    fmt = fmt or detect_format(path)
+    if fmt == 'gzip':
+        return gzip.open(path, 'rb')
+    if fmt == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd input needs the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    if fmt == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            # The member keeps its own handle on the archive file after this closes.
+            return archive.open(_zip_member(archive))
+    if fmt in ('parquet', 'excel'):
+        raise ValueError(f"{fmt} input is not CSV text")
+    return open(path, 'rb')
+
+
+def estimated_size(path):
+    # Roughly how many bytes of CSV text the file holds, to pick in-memory or streaming.
+    fmt = detect_format(path)
+    size = os.path.getsize(path)
+    if fmt == 'gzip':
+        # ISIZE, the last field, is only the final member's length mod 2**32, so multi-member or
+        # >4 GiB files under-report it; never go below the ratio estimate.
+        with open(path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            isize = int.from_bytes(f.read(4), 'little')
+        return max(isize, size * COMPRESSION_RATIO_ESTIMATE)
+    if fmt == 'zstd':
+        with open(path, 'rb') as f:
+            content_size = zstandard.frame_content_size(f.read(18)) if zstandard is not None else -1
+        return content_size if content_size > 0 else size * COMPRESSION_RATIO_ESTIMATE
+    if fmt == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            return _zip_member(archive).file_size
+    if fmt == 'parquet' and pq is not None:
+        metadata = pq.ParquetFile(path).metadata
+        return sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+    if fmt == 'excel' and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return sum(info.file_size for info in archive.infolist())
+    return size
+
+
+def _parquet_as_text(table):
+    # Parquet columns can be typed; phone numbers stored as doubles must not come out as '447700900123.0'.
+    columns = []
+    for column in table.columns:
+        if pa.types.is_floating(column.type):
+            try:
+                column = column.cast(pa.int64())
+            except pa.ArrowInvalid:
+                pass
+        columns.append(column.cast(pa.string()))
+    return pa.table(columns, names=table.column_names).to_pandas()
+
+
+def read_header(path):
+    fmt = detect_format(path)
+    if fmt == 'parquet':
+        _require_parquet()
+        return pq.read_schema(path).names
+    if fmt == 'excel':
+        return pd.read_excel(path, nrows=0).columns.tolist()
+    with open_csv(path, fmt) as f:
+        return pd.read_csv(f, nrows=0).columns.tolist()
+
+
+def read_preview(path, rows=PREVIEW_ROWS):
+    # Only the header and a handful of rows are needed to render the column picker.
+    fmt = detect_format(path)
+    if fmt == 'parquet':
+        _require_parquet()
+        batch = next(pq.ParquetFile(path).iter_batches(batch_size=rows), None)
+        df = batch.to_pandas() if batch is not None else pd.DataFrame(columns=pq.read_schema(path).names)
+        df = df.head(rows)
+    elif fmt == 'excel':
+        df = pd.read_excel(path, nrows=rows)
+    else:
+        with open_csv(path, fmt) as f:
+            df = pd.read_csv(f, nrows=rows)
+    return df.columns.tolist(), df.to_dict(orient='records')
+
+
+def columnar_cache_path(csv_path):
+    return f"{csv_path}.parquet"
+
+
+def _iter_text_chunks(path, fmt, columns=None, chunk_rows=CACHE_CHUNK_ROWS):
+    if fmt == 'parquet':
+        _require_parquet()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield _parquet_as_text(pa.Table.from_batches([batch]))
+    elif fmt == 'excel':
+        # Workbooks cannot be read incrementally; load once and hand out slices.
+        df = pd.read_excel(path, usecols=columns, dtype=str)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+    else:
+        with open_csv(path, fmt) as f:
+            yield from pd.read_csv(f, usecols=columns, dtype=str, chunksize=chunk_rows)
+
+
+def _iter_cache_batches(path, fmt, chunk_rows=CACHE_CHUNK_ROWS):
+    # Record batches of text columns for the cache. CSV text goes through Arrow's streaming reader,
+    # which parses blocks on all cores; the header comes from pandas so column names match the picker.
+    if fmt in ('parquet', 'excel'):
+        for chunk in _iter_text_chunks(path, fmt, chunk_rows=chunk_rows):
+            yield from pa.Table.from_pandas(chunk, preserve_index=False).to_batches()
+        return
+    columns = read_header(path)
+    with open_csv(path, fmt) as f:
+        reader = pa_csv.open_csv(
+            f,
+            read_options=pa_csv.ReadOptions(column_names=columns, skip_rows=1, block_size=CACHE_BLOCK_BYTES),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={col: pa.string() for col in columns},
+                null_values=NA_VALUES,
+                strings_can_be_null=True,
+            ),
+        )
+        yield from reader
+
+
+def build_columnar_cache(csv_path, chunk_rows=CACHE_CHUNK_ROWS):
+    # Parse the upload once, with the same options process() uses, into Parquet.
+    cache_path = columnar_cache_path(csv_path)
+    tmp_path = f"{cache_path}.tmp"
+    writer = None
+    try:
+        for batch in _iter_cache_batches(csv_path, detect_format(csv_path), chunk_rows=chunk_rows):
+            if writer is None:
+                schema = pa.schema([pa.field(name, pa.string()) for name in batch.schema.names])
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(pa.Table.from_batches([batch]).cast(writer.schema))
+        if writer is None:
+            return None
+        writer.close()
+        writer = None
+        os.replace(tmp_path, cache_path)
+        return cache_path
+    except Exception:
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def start_cache_build(csv_path):
+    if pq is None or detect_format(csv_path) == 'parquet':
+        return None
+    with _cache_lock:
+        # A re-uploaded file may already have its cache, or one being built.
+        thread = _cache_builds.get(csv_path)
+        if thread is not None or os.path.exists(columnar_cache_path(csv_path)):
+            return thread
+        thread = threading.Thread(target=build_columnar_cache, args=(csv_path,), daemon=True)
+        _cache_builds[csv_path] = thread
+    thread.start()
+    return thread
+
+
+def wait_for_cache(csv_path):
+    with _cache_lock:
+        thread = _cache_builds.pop(csv_path, None)
+    if thread is not None:
+        thread.join()
+    cache_path = columnar_cache_path(csv_path)
+    return cache_path if pq is not None and os.path.exists(cache_path) else None
+
+
+def read_csv_columns(csv_path, columns, engine=CSV_ENGINE, fmt=None):
+    # Only the mapped columns, always as text: phone numbers must never go through float.
+    with open_csv(csv_path, fmt) as f:
+        if engine == 'pyarrow' and pa_csv is not None:
+            convert = pa_csv.ConvertOptions(
+                column_types={col: pa.string() for col in columns},
+                include_columns=columns,
+                null_values=NA_VALUES,
+                strings_can_be_null=True,
+            )
+            return pa_csv.read_csv(f, convert_options=convert).to_pandas()
+        return pd.read_csv(f, usecols=columns, dtype=str)
+
+
+def read_columns_as_text(path, columns):
+    fmt = detect_format(path)
+    if fmt == 'parquet':
+        _require_parquet()
+        return _parquet_as_text(pq.read_table(path, columns=columns))
+    if fmt == 'excel':
+        return pd.read_excel(path, usecols=columns, dtype=str)
+    return read_csv_columns(path, columns, fmt=fmt)
+
+
+def read_frame(csv_path, columns):
+    cache_path = wait_for_cache(csv_path)
+    if cache_path:
+        return pq.read_table(cache_path, columns=columns).to_pandas()
+    return read_columns_as_text(csv_path, columns)
+
+
+def iter_chunks(csv_path, columns, chunk_rows=CACHE_CHUNK_ROWS):
+    cache_path = wait_for_cache(csv_path)
+    if cache_path:
+        for batch in pq.ParquetFile(cache_path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from _iter_text_chunks(csv_path, detect_format(csv_path), columns, chunk_rows)
+
+
+def remove_upload(csv_path):
+    wait_for_cache(csv_path)
+    for path in (csv_path, columnar_cache_path(csv_path)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
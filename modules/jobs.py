@@ -0,0 +1,86 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+JOB_WORKERS = 2
+JOB_TTL_SECONDS = 6 * 60 * 60
+JOB_STAGES = ('parsed', 'normalized', 'hashed')
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='clean-job')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for job_id in [job_id for job_id, job in _jobs.items() if job.get('finished') and job['finished'] < cutoff]:
+        del _jobs[job_id]
+
+
+def _record_progress(job, stage, rows):
+    with _jobs_lock:
+        job['stage'] = stage
+        job['progress'][stage] = job['progress'].get(stage, 0) + rows
+
+
+def _run_job(job, fn, args, kwargs):
+    with _jobs_lock:
+        job['status'] = 'running'
+        job['stage'] = 'started'
+    try:
+        result = fn(*args, progress=partial(_record_progress, job), **kwargs)
+        with _jobs_lock:
+            job['result'] = result
+            job['status'] = 'done'
+    except Exception as e:
+        traceback.print_exc()
+        with _jobs_lock:
+            job['error'] = str(e)
+            job['status'] = 'failed'
+    finally:
+        with _jobs_lock:
+            job['finished'] = time.time()
+
+
+def _new_job():
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'status': 'queued',
+        'stage': 'queued',
+        'progress': {stage: 0 for stage in JOB_STAGES},
+        'result': None,
+        'error': None,
+        'created': time.time(),
+        'finished': None,
+    }
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job_id] = job
+    return job
+
+
+def submit_job(fn, *args, **kwargs):
+    # fn must accept a progress(stage, rows) keyword callback.
+    job = _new_job()
+    _executor.submit(_run_job, job, fn, args, kwargs)
+    return job['id']
+
+
+def finished_job(result):
+    # For results that were already on hand, e.g. memoized from an identical earlier run.
+    job = _new_job()
+    with _jobs_lock:
+        job.update(status='done', stage='done', result=result, finished=time.time())
+    return job['id']
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return dict(job, progress=dict(job['progress']))
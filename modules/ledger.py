@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+AUDIENCE_LEDGER_PATH = os.environ.get('AUDIENCE_LEDGER_PATH',
+                                      os.path.join(tempfile.gettempdir(), 'audience_ledger.sqlite3'))
+LEDGER_SCHEMA = ['FN', 'LN', 'PHONE']
+
+
+class AudienceLedger:
+    """Members already uploaded to each custom audience, so a refresh only sends the difference."""
+
+    def __init__(self, path=AUDIENCE_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS members "
+                         "(audience_id TEXT NOT NULL, fn TEXT NOT NULL, ln TEXT NOT NULL, phone TEXT NOT NULL, "
+                         "uploaded REAL NOT NULL, PRIMARY KEY (audience_id, phone, fn, ln)) WITHOUT ROWID")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def diff(self, audience_id, rows):
+        # rows are (FN, LN, PHONE) tuples; returns (members to add, members to remove).
+        with self._lock:
+            conn = self._connection()
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming "
+                         "(fn TEXT NOT NULL, ln TEXT NOT NULL, phone TEXT NOT NULL, PRIMARY KEY (phone, fn, ln))")
+            conn.execute("DELETE FROM incoming")
+            try:
+                conn.executemany("INSERT OR IGNORE INTO incoming (fn, ln, phone) VALUES (?, ?, ?)", rows)
+                added = conn.execute("SELECT fn, ln, phone FROM incoming EXCEPT "
+                                     "SELECT fn, ln, phone FROM members WHERE audience_id = ?",
+                                     (audience_id,)).fetchall()
+                removed = conn.execute("SELECT fn, ln, phone FROM members WHERE audience_id = ? EXCEPT "
+                                       "SELECT fn, ln, phone FROM incoming", (audience_id,)).fetchall()
+            finally:
+                conn.execute("DELETE FROM incoming")
+                conn.commit()
+        return added, removed
+
+    def record(self, audience_id, added=(), removed=()):
+        # Only called once Meta has accepted the change, so a failed upload is retried next run.
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO members (audience_id, fn, ln, phone, uploaded) "
+                             "VALUES (?, ?, ?, ?, ?)", ((audience_id, fn, ln, phone, now) for fn, ln, phone in added))
+            conn.executemany("DELETE FROM members WHERE audience_id = ? AND fn = ? AND ln = ? AND phone = ?",
+                             ((audience_id, fn, ln, phone) for fn, ln, phone in removed))
+            conn.commit()
+
+    def count(self, audience_id):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM members WHERE audience_id = ?",
+                                              (audience_id,)).fetchone()[0]
+
+
+_ledger = None
+
+
+def get_ledger():
+    global _ledger
+    if _ledger is None:
+        _ledger = AudienceLedger()
+    return _ledger
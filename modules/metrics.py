@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+from digest_cache import get_digest_cache
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def peak_rss_mb():
+    # Lifetime high-water mark of the whole process; only meaningful as a process-level gauge.
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * PAGE_SIZE / (1024 * 1024)
+
+
+class StageStats:
+    """Wall time, CPU time, row counts and memory growth for each pipeline stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, name, wall, cpu, rows_in, rows_out, rss_growth_mb=None):
+        stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'rows_in': 0, 'rows_out': 0,
+                                              'rss_growth_mb': None})
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        stage['rows_in'] += rows_in or 0
+        stage['rows_out'] += rows_out or 0
+        if rss_growth_mb is not None:
+            # The largest growth over a single run, e.g. the biggest chunk.
+            stage['rss_growth_mb'] = max(stage['rss_growth_mb'] or 0, rss_growth_mb)
+
+    def measure(self, name, fn, *args, rows_in=None, **kwargs):
+        rss = current_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn(*args, **kwargs)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        rows_out = len(result) if hasattr(result, 'shape') else rows_in
+        if rows_in is None:
+            rows_in = rows_out
+        rss_after = current_rss_mb()
+        growth = rss_after - rss if rss is not None and rss_after is not None else None
+        self.record(name, wall, cpu, rows_in, rows_out, growth)
+        return result
+
+    def merge(self, stages):
+        # Stages measured in pool workers come back as plain dicts.
+        for name, other in stages.items():
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = dict(other)
+                continue
+            for key in ('wall', 'cpu', 'rows_in', 'rows_out'):
+                stage[key] += other[key]
+            if other['rss_growth_mb'] is not None:
+                stage['rss_growth_mb'] = max(stage['rss_growth_mb'] or 0, other['rss_growth_mb'])
+        return self
+
+    def merge_overlapped(self, stages, elapsed):
+        # Pool workers run side by side, so their summed wall time overstates how long the stages took.
+        # Share out the wall-clock time the parent actually waited, in proportion; CPU stays summed.
+        total = sum(stage['wall'] for stage in stages.values())
+        scale = elapsed / total if total else 0.0
+        return self.merge({name: dict(stage, wall=stage['wall'] * scale) for name, stage in stages.items()})
+
+    def wall_total(self):
+        return sum(stage['wall'] for stage in self.stages.values())
+
+    def as_list(self):
+        rows = []
+        for name, stage in self.stages.items():
+            rows_per_sec = stage['rows_in'] / stage['wall'] if stage['wall'] else None
+            rows.append(dict(stage, stage=name, rows_per_sec=rows_per_sec))
+        return rows
+
+
+# Process-wide totals, exported at /metrics in Prometheus text format.
+_totals = {'stages': {}, 'jobs': {}}
+_totals_lock = threading.Lock()
+
+
+def record_job(stats, status):
+    with _totals_lock:
+        _totals['jobs'][status] = _totals['jobs'].get(status, 0) + 1
+        for name, stage in stats.stages.items():
+            total = _totals['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'rows_in': 0, 'rows_out': 0,
+                                                        'last_rows_per_sec': 0.0})
+            for key in ('wall', 'cpu', 'rows_in', 'rows_out'):
+                total[key] += stage[key]
+            if stage['wall']:
+                total['last_rows_per_sec'] = stage['rows_in'] / stage['wall']
+
+
+def render_prometheus():
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+    with _totals_lock:
+        stages = {name: dict(stage) for name, stage in _totals['stages'].items()}
+        jobs = dict(_totals['jobs'])
+
+    metric('cleaning_jobs_total', 'counter', 'Cleaning jobs finished, by status.',
+           [({'status': status}, count) for status, count in jobs.items()])
+    metric('cleaning_stage_wall_seconds_total', 'counter', 'Wall time spent in each pipeline stage.',
+           [({'stage': name}, stage['wall']) for name, stage in stages.items()])
+    metric('cleaning_stage_cpu_seconds_total', 'counter', 'CPU time spent in each pipeline stage.',
+           [({'stage': name}, stage['cpu']) for name, stage in stages.items()])
+    metric('cleaning_stage_rows_total', 'counter', 'Rows entering and leaving each pipeline stage.',
+           [({'stage': name, 'direction': 'in'}, stage['rows_in']) for name, stage in stages.items()]
+           + [({'stage': name, 'direction': 'out'}, stage['rows_out']) for name, stage in stages.items()])
+    metric('cleaning_stage_rows_per_second', 'gauge', 'Throughput of the most recent run of each stage.',
+           [({'stage': name}, stage['last_rows_per_sec']) for name, stage in stages.items()])
+    cache = get_digest_cache()
+    if cache is not None:
+        # Totals come from the cache file, so lookups made in pool workers are counted too.
+        cache_stats = cache.stats()
+        metric('digest_cache_hits_total', 'counter', 'Digest cache lookups answered from the cache.',
+               [({}, cache_stats['total_hits'])])
+        metric('digest_cache_misses_total', 'counter', 'Digest cache lookups that had to be hashed.',
+               [({}, cache_stats['total_misses'])])
+        metric('digest_cache_entries', 'gauge', 'Digests currently stored in the cache.',
+               [({}, cache_stats['entries'])])
+    peak = peak_rss_mb()
+    if peak is not None:
+        metric('cleaning_peak_rss_megabytes', 'gauge', 'Peak resident memory of this process.', [({}, peak)])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,63 @@
+import re
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_name(name):
+    if isinstance(name, str):
+        name = unidecode(name.lower())
+        name = re.sub(r'[^\w\s]', '', name)
+        name = name.replace(" ", "")
+        return name
+    return ""
+
+
+def _normalize_distinct_name(name):
+    if not isinstance(name, str):
+        return ""
+    name = name.lower()
+    # unidecode is the identity on ASCII input, so most names can skip it.
+    if not name.isascii():
+        name = unidecode(name)
+    return _NON_WORD_RE.sub('', name).replace(" ", "")
+
+
+def normalize_name_column(series):
+    # First/last names repeat a lot; normalize each distinct value once.
+    codes, uniques = pd.factorize(series)
+    normalized = np.array([_normalize_distinct_name(value) for value in uniques] + [""], dtype=object)
+    return pd.Series(normalized[codes], index=series.index, dtype=object)
+
+
+NAME_PARTICLES = (
+    "van", "von", "der", "den", "de", "del", "della", "da", "das", "dos", "du",
+    "di", "la", "le", "st", "bin", "binti", "al", "el", "ben", "mac", "ter",
+)
+
+NAME_SPLIT_PATTERNS = {
+    # "Jean Paul Sartre" -> ("Jean", "Sartre")
+    "first_last": r'^\s*(\S+)(?:.*\s(\S+))?\s*$',
+    # "Jean Paul Sartre" -> ("Jean", "Paul Sartre")
+    "first_rest": r'^\s*(\S+)(?:\s+(.*\S))?\s*$',
+    # "Ludwig van Beethoven" -> ("Ludwig", "van Beethoven")
+    "particles": r'^\s*(\S+)(?:.*?\s((?:(?:' + '|'.join(NAME_PARTICLES) + r')\s+)*\S+))?\s*$',
+}
+
+
+def split_full_names(series, mode="first_last"):
+    pattern = NAME_SPLIT_PATTERNS.get(mode)
+    if pattern is None:
+        raise ValueError(f"Unknown name split mode: {mode}")
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        blank = pd.Series("", index=series.index, dtype=object)
+        return pd.DataFrame({"fn": blank, "ln": blank.copy()})
+
+    parts = series.str.extract(pattern, flags=re.DOTALL | re.IGNORECASE)
+    fn = parts[0].fillna("")
+    # Single-token names are used for both first and last name.
+    ln = parts[1].fillna(fn)
+    return pd.DataFrame({"fn": fn.astype(object), "ln": ln.astype(object)}, index=series.index)
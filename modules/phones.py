@@ -0,0 +1,93 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+from phonenumbers import PhoneMetadata
+
+LEGACY_PHONE_DIGITS = 10
+# Shortest full international number (calling code + national number), e.g. Niue's +683 xxxx.
+MIN_INTERNATIONAL_DIGITS = 7
+
+_DIGITS_RE = re.compile(r"^\d+$")
+
+
+@lru_cache(maxsize=None)
+def get_phone_rules(iso_code):
+    # One metadata lookup per country: calling code, trunk prefix, valid national lengths.
+    metadata = PhoneMetadata.metadata_for_region(iso_code.upper(), None) if iso_code else None
+    if metadata is None:
+        return None
+    lengths = set()
+    for desc in (metadata.mobile, metadata.fixed_line):
+        if desc is not None:
+            lengths.update(n for n in desc.possible_length if n > 0)
+    if not lengths:
+        lengths.update(n for n in metadata.general_desc.possible_length if n > 0)
+    intl_prefixes = ["00"]
+    if metadata.international_prefix and _DIGITS_RE.match(metadata.international_prefix):
+        intl_prefixes.append(metadata.international_prefix)
+    return {
+        'country_code': str(metadata.country_code),
+        'trunk_prefix': metadata.national_prefix or "",
+        'lengths': sorted(lengths),
+        'intl_prefixes': sorted(set(intl_prefixes), key=len, reverse=True),
+    }
+
+
+def _strip_prefix(digits, prefix, mask):
+    return digits.where(~mask, digits.str[len(prefix):])
+
+
+def _to_e164(digits, international, rules):
+    cc = rules['country_code']
+    lengths = rules['lengths']
+
+    # 00 / 011 / ... introduces a full international number, whichever country it is for.
+    for prefix in rules['intl_prefixes']:
+        dialed = (~international & digits.str.startswith(prefix)
+                  & (digits.str.len() - len(prefix) >= MIN_INTERNATIONAL_DIGITS))
+        digits = _strip_prefix(digits, prefix, dialed)
+        international = international | dialed
+
+    # Numbers dialed with another country's code keep that code.
+    foreign = international & ~digits.str.startswith(cc)
+
+    length = digits.str.len()
+    has_cc = ~foreign & digits.str.startswith(cc) & (length - len(cc)).isin(lengths)
+    has_cc &= international | ~length.isin(lengths)
+    digits = _strip_prefix(digits, cc, has_cc)
+
+    trunk = rules['trunk_prefix']
+    if trunk:
+        has_trunk = ~foreign & digits.str.startswith(trunk) & (digits.str.len() - len(trunk)).isin(lengths)
+        digits = _strip_prefix(digits, trunk, has_trunk)
+
+    # Anything still too long is trimmed to the longest national number, like the old str[-10:].
+    longest = max(lengths)
+    too_long = ~foreign & (digits.str.len() > longest)
+    digits = digits.where(~too_long, digits.str[-longest:])
+
+    e164 = ("+" + cc) + digits
+    e164 = e164.where(~foreign, "+" + digits)
+    return e164.where(digits.str.len() > 0, "")
+
+
+def normalize_phone_column(phones, iso_codes):
+    raw = phones.astype(object).where(phones.notna(), "").astype(str).str.strip()
+    international = raw.str.startswith("+")
+    digits = raw.str.replace(r"\D", "", regex=True)
+
+    result = pd.Series("", index=phones.index, dtype=object)
+    groups = pd.Series(iso_codes.to_numpy()).groupby(iso_codes.to_numpy(), sort=False).indices
+    for iso_code, positions in groups.items():
+        group_digits = digits.iloc[positions]
+        rules = get_phone_rules(iso_code)
+        if rules is None:
+            # No country to dial from: keep explicit international numbers, otherwise the old behaviour.
+            group_international = international.iloc[positions]
+            fallback = group_digits.str[-LEGACY_PHONE_DIGITS:]
+            values = fallback.where(~group_international | (group_digits.str.len() == 0), "+" + group_digits)
+        else:
+            values = _to_e164(group_digits, international.iloc[positions], rules)
+        result.iloc[positions] = values.to_numpy(dtype=object)
+    return result
@@ -0,0 +1,243 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from countries import resolve_country_column
+from dedup import KeepLastDeduplicator, partitions_for_rows
+from hashing import hash_columns, hashed_frame
+from ingest import estimated_size, iter_chunks, read_frame, read_header
+from metrics import StageStats, current_rss_mb
+from names import normalize_name_column, split_full_names
+from phones import normalize_phone_column
+
+CLEAN_COLUMNS = ['phone', 'fn', 'ln', 'country_iso_code']
+
+STREAMING_THRESHOLD_BYTES = 200 * 1024 * 1024
+STREAMING_CHUNK_ROWS = 250000
+ESTIMATED_ROW_BYTES = 100
+
+# Hashed results are kept gzip-compressed; /download streams or re-encodes them on the fly.
+OUTPUT_COMPRESSION = {'method': 'gzip', 'compresslevel': 1}
+
+# Bump whenever cleaning or hashing output changes, so memoized results are not reused.
+PIPELINE_VERSION = '3'
+
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', os.cpu_count() or 1))
+PARALLEL_MIN_ROWS = 200000
+PARALLEL_PARTITION_ROWS = 100000
+
+
+def pool_context():
+    # Forking the threaded web process can copy a lock mid-acquire into the child; start workers from
+    # a clean server process instead where the platform has one.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def read_columns(path):
+    return read_header(path)
+
+
+def mapped_columns(mapping):
+    mapped = [mapping['phone_col'], mapping['country_col'], mapping['fn_col'], mapping['ln_col']]
+    return list(dict.fromkeys(mapped))
+
+
+def missing_columns(columns, mapping):
+    return [col for col in mapped_columns(mapping) if col not in columns]
+
+
+def clean_frame(df, mapping, stats=None):
+    stats = stats if stats is not None else StageStats()
+    fn_col = mapping['fn_col']
+    ln_col = mapping['ln_col']
+    rows = len(df)
+
+    if fn_col == ln_col:
+        names = stats.measure('name_split', split_full_names, df[fn_col], mapping.get('name_split', 'first_last'),
+                              rows_in=rows)
+        fn, ln = names['fn'], names['ln']
+    else:
+        fn, ln = df[fn_col], df[ln_col]
+
+    fn, ln = stats.measure('normalize', lambda: (normalize_name_column(fn), normalize_name_column(ln)), rows_in=rows)
+    country_iso_code = stats.measure('country', resolve_country_column, df[mapping['country_col']], rows_in=rows)
+    phone = stats.measure('phone', normalize_phone_column, df[mapping['phone_col']], country_iso_code, rows_in=rows)
+    return pd.DataFrame({
+        'phone': phone,
+        'fn': fn,
+        'ln': ln,
+        'country_iso_code': country_iso_code,
+    }, index=df.index, copy=False)
+
+
+def _clean_partition(df, mapping):
+    # Runs in pool workers, so the stage timings travel back with the frame.
+    stats = StageStats()
+    return clean_frame(df, mapping, stats), stats.stages
+
+
+def dedup_phones(data):
+    return data.drop_duplicates(subset=['phone'], keep='last')
+
+
+def split_rows(df, partition_rows=None):
+    partition_rows = partition_rows or PARALLEL_PARTITION_ROWS
+    return [df.iloc[start:start + partition_rows] for start in range(0, len(df), partition_rows)]
+
+
+def ordered_map(fn, items, workers=1):
+    # Results come back in input order; at most 2 * workers items are in flight at once.
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _no_progress(stage, rows):
+    pass
+
+
+def run_pipeline(df, mapping, workers=1, progress=_no_progress, stats=None):
+    stats = stats if stats is not None else StageStats()
+    progress('parsed', len(df))
+    if workers <= 1 or len(df) < PARALLEL_MIN_ROWS:
+        cleaned = clean_frame(df, mapping, stats)
+        progress('normalized', len(cleaned))
+        data = stats.measure('dedup', dedup_phones, cleaned, rows_in=len(cleaned))
+        hashed = stats.measure('hash', hash_columns, data, rows_in=len(data))
+        progress('hashed', len(hashed))
+        return data, hashed
+
+    parts = []
+    worker_stats = StageStats()
+    start = time.perf_counter()
+    for part, part_stages in ordered_map(partial(_clean_partition, mapping=mapping), split_rows(df), workers):
+        parts.append(part)
+        worker_stats.merge(part_stages)
+        progress('normalized', len(part))
+    stats.merge_overlapped(worker_stats.stages, time.perf_counter() - start)
+    data = stats.measure('dedup', lambda: dedup_phones(pd.concat(parts)), rows_in=len(df))
+
+    def hash_partitions():
+        hashed_parts = []
+        for part in ordered_map(hash_columns, split_rows(data), workers):
+            hashed_parts.append(part)
+            progress('hashed', len(part))
+        return np.concatenate(hashed_parts) if hashed_parts else hash_columns(data)
+
+    return data, stats.measure('hash', hash_partitions, rows_in=len(data))
+
+
+def write_hashed(hashed, output_path, append=False):
+    # Digests are only hex-encoded here, on the way out.
+    hashed_frame(hashed).to_csv(output_path, mode='a' if append else 'w', header=not append, index=False,
+                  compression=OUTPUT_COMPRESSION)
+
+
+def _surviving_rows(spill_path, keep, chunk_rows, preview, preview_rows):
+    offset = 0
+    for chunk in pd.read_csv(spill_path, dtype=str, na_filter=False, chunksize=chunk_rows):
+        data = chunk[keep[offset:offset + len(chunk)]]
+        offset += len(chunk)
+        if len(preview) < preview_rows:
+            preview.extend(data.head(preview_rows - len(preview)).to_dict(orient='records'))
+        yield data
+
+
+def _timed_chunks(chunks, stats):
+    chunks = iter(chunks)
+    while True:
+        start_rss = current_rss_mb()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        rss = current_rss_mb()
+        growth = rss - start_rss if rss is not None and start_rss is not None else None
+        stats.record('parse', wall, cpu, len(chunk), len(chunk), growth)
+        yield chunk
+
+
+def run_pipeline_streaming(chunks, mapping, output_path, chunk_rows=STREAMING_CHUNK_ROWS, preview_rows=10,
+                           dedup_partitions=1, workers=1, progress=_no_progress, stats=None):
+    # Pass 1 cleans chunk by chunk into a spill file and hands the phones to the deduplicator.
+    # Pass 2 keeps only the surviving rows, so the output matches drop_duplicates(keep='last').
+    stats = stats if stats is not None else StageStats()
+    spill_fd, spill_path = tempfile.mkstemp(suffix='.csv', prefix='clean_spill_')
+    os.close(spill_fd)
+    deduplicator = KeepLastDeduplicator(dedup_partitions)
+    total_rows = 0
+    worker_stats = StageStats()
+    try:
+        # Parsing, dedup and spill are timed here in the parent; whatever else the loop waits on is cleaning.
+        start, parent_wall = time.perf_counter(), stats.wall_total()
+        cleaning = ordered_map(partial(_clean_partition, mapping=mapping), _timed_chunks(chunks, stats), workers)
+        for cleaned, part_stages in cleaning:
+            worker_stats.merge(part_stages)
+            progress('parsed', len(cleaned))
+            progress('normalized', len(cleaned))
+            stats.measure('dedup', deduplicator.add, cleaned['phone'], rows_in=len(cleaned))
+            stats.measure('spill', cleaned.to_csv, spill_path, mode='w' if total_rows == 0 else 'a',
+                          header=total_rows == 0, index=False, rows_in=len(cleaned))
+            total_rows += len(cleaned)
+        waited = time.perf_counter() - start - (stats.wall_total() - parent_wall)
+        stats.merge_overlapped(worker_stats.stages, max(waited, 0.0))
+
+        keep = stats.measure('dedup', deduplicator.keep_mask, rows_in=0)
+        # Rows only drop out once the buckets are merged, so the stage output is the surviving count.
+        stats.stages['dedup']['rows_out'] = int(keep.sum())
+
+        preview = []
+        kept_rows = 0
+        write_hashed(hash_columns(pd.DataFrame(columns=CLEAN_COLUMNS)), output_path)
+        if total_rows:
+            surviving = _surviving_rows(spill_path, keep, chunk_rows, preview, preview_rows)
+            hashing = ordered_map(hash_columns, surviving, workers)
+            while True:
+                hashed = stats.measure('hash', next, hashing, None)
+                if hashed is None:
+                    break
+                stats.measure('write', write_hashed, hashed, output_path, append=True, rows_in=len(hashed))
+                kept_rows += len(hashed)
+                progress('hashed', len(hashed))
+    finally:
+        deduplicator.close()
+        os.remove(spill_path)
+
+    return preview, kept_rows
+
+
+def process_upload(path, mapping, output_path, workers=1, progress=_no_progress, stats=None):
+    stats = stats if stats is not None else StageStats()
+    size = estimated_size(path)
+    if size >= STREAMING_THRESHOLD_BYTES:
+        # Large files are cleaned chunk by chunk so memory stays flat.
+        chunks = iter_chunks(path, mapped_columns(mapping), STREAMING_CHUNK_ROWS)
+        partitions = partitions_for_rows(size // ESTIMATED_ROW_BYTES)
+        preview, rows = run_pipeline_streaming(chunks, mapping, output_path, dedup_partitions=partitions,
+                                               workers=workers, progress=progress, stats=stats)
+    else:
+        df = stats.measure('parse', read_frame, path, mapped_columns(mapping))
+        data, hashed_df = run_pipeline(df, mapping, workers=workers, progress=progress, stats=stats)
+        stats.measure('write', write_hashed, hashed_df, output_path, rows_in=len(hashed_df))
+        preview = data.head(10).to_dict(orient="records")
+        rows = len(hashed_df)
+    return {'preview': preview, 'columns': CLEAN_COLUMNS, 'rows': rows, 'output_path': output_path,
+            'stages': stats.as_list()}
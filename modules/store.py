@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+STORE_DIR = os.environ.get('UPLOAD_STORE_DIR', os.path.join(tempfile.gettempdir(), 'audience_store'))
+UPLOADS_DIR = os.path.join(STORE_DIR, 'uploads')
+RESULTS_DIR = os.path.join(STORE_DIR, 'results')
+STORE_TTL_SECONDS = int(os.environ.get('UPLOAD_STORE_TTL_SECONDS', 24 * 60 * 60))
+STORE_MAX_BYTES = int(os.environ.get('UPLOAD_STORE_MAX_BYTES', 20 * 1024 ** 3))
+SWEEP_INTERVAL_SECONDS = 10 * 60
+COPY_BLOCK_BYTES = 1024 * 1024
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def _ensure_dirs():
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+def _touch(path):
+    # The sweeper evicts by mtime, so every reuse counts as fresh.
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def save_upload(stream, filename):
+    # Hash while copying; identical content lands on the same file and the copy is dropped.
+    _ensure_dirs()
+    ext = os.path.splitext(filename)[1].lower()
+    tmp_path = os.path.join(UPLOADS_DIR, f"{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                block = stream.read(COPY_BLOCK_BYTES)
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+        content_hash = digest.hexdigest()
+        path = os.path.join(UPLOADS_DIR, content_hash + ext)
+        if _touch(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return content_hash, path
+
+
+def result_key(content_hash, mapping, version):
+    key = json.dumps({'upload': content_hash, 'mapping': mapping, 'version': version}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def result_paths(key):
+    _ensure_dirs()
+    return os.path.join(RESULTS_DIR, f"{key}.csv.gz"), os.path.join(RESULTS_DIR, f"{key}.json")
+
+
+def load_result(key):
+    output_path, meta_path = result_paths(key)
+    if not (os.path.exists(output_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not (_touch(output_path) and _touch(meta_path)):
+        return None
+    result['output_path'] = output_path
+    return result
+
+
+def save_result(key, result):
+    # Written last, so a result only counts as cached once its output is complete.
+    _, meta_path = result_paths(key)
+    tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({k: v for k, v in result.items() if k != 'output_path'}, f)
+    os.replace(tmp_path, meta_path)
+
+
+def sweep(ttl_seconds=STORE_TTL_SECONDS, max_bytes=STORE_MAX_BYTES, now=None):
+    now = time.time() if now is None else now
+    files = []
+    for directory in (UPLOADS_DIR, RESULTS_DIR):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+    # Expired files first, then the least recently used until the store fits its budget.
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if mtime >= now - ttl_seconds and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _sweep_forever(interval):
+    while True:
+        try:
+            sweep()
+        except Exception:
+            pass
+        time.sleep(interval)
+
+
+def start_sweeper(interval=SWEEP_INTERVAL_SECONDS):
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, args=(interval,), daemon=True, name='store-sweeper')
+            _sweeper.start()
+    return _sweeper
@@ -0,0 +1,98 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from facebook_business.exceptions import FacebookRequestError
+
+from graph import TRANSIENT_ERROR_CODES, backoff_delay
+
+UPLOAD_BATCH_ROWS = 10000  # Meta rejects larger payloads
+UPLOAD_WORKERS = 4
+UPLOAD_MAX_RETRIES = 5
+INVALID_SAMPLE_LIMIT = 20
+
+
+def is_transient(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, FacebookRequestError):
+        return (error.api_transient_error() or error.api_error_code() in TRANSIENT_ERROR_CODES
+                or (error.http_status() or 0) >= 500)
+    return False
+
+
+def call_with_retries(fn, *args, retries=UPLOAD_MAX_RETRIES, **kwargs):
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+def upload_in_batches(send, schema, rows, batch_rows=UPLOAD_BATCH_ROWS, workers=UPLOAD_WORKERS):
+    # send(params) makes one users-edge call, e.g. audience.create_user(fields=[], params=params).
+    # Batches share an upload session and go out concurrently; the one carrying last_batch_flag
+    # is sent only after the rest succeed, since Meta closes the session when it arrives.
+    session_id = random.randint(1, 2 ** 63 - 1)
+    batches = [rows[start:start + batch_rows] for start in range(0, len(rows), batch_rows)]
+    report = {
+        'session_id': session_id,
+        'batches': len(batches),
+        'num_received': 0,
+        'num_invalid_entries': 0,
+        'invalid_entry_samples': {},
+        'accepted': [],
+        'failed': [],
+    }
+    if not batches:
+        return report
+
+    def send_batch(seq):
+        params = {
+            'payload': {'schema': schema, 'data': [list(row) for row in batches[seq - 1]]},
+            'session': {
+                'session_id': session_id,
+                'batch_seq': seq,
+                'last_batch_flag': seq == len(batches),
+                'estimated_num_total': len(rows),
+            },
+        }
+        return call_with_retries(send, params)
+
+    def collect(seq, response=None, error=None):
+        if error is not None:
+            report['failed'].append({'batch_seq': seq, 'rows': len(batches[seq - 1]), 'error': str(error)})
+            return
+        response = dict(response or {})
+        report['num_received'] += int(response.get('num_received', 0))
+        report['num_invalid_entries'] += int(response.get('num_invalid_entries', 0))
+        samples = report['invalid_entry_samples']
+        for key, value in (response.get('invalid_entry_samples') or {}).items():
+            if len(samples) < INVALID_SAMPLE_LIMIT:
+                samples[key] = value
+        report['accepted'].extend(batches[seq - 1])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {seq: pool.submit(send_batch, seq) for seq in range(1, len(batches))}
+        for seq, future in futures.items():
+            try:
+                collect(seq, future.result())
+            except Exception as e:
+                collect(seq, error=e)
+
+    last = len(batches)
+    if report['failed']:
+        # Leave the session open rather than closing it on a partial upload.
+        report['failed'].append({'batch_seq': last, 'rows': len(batches[-1]),
+                                 'error': "not sent: earlier batches failed"})
+        return report
+    try:
+        collect(last, send_batch(last))
+    except Exception as e:
+        collect(last, error=e)
+    return report
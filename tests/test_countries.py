@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from countries import resolve_country  # noqa: E402
+
+
+def test_accents_are_optional():
+    assert resolve_country("Curacao") == "CW"
+    assert resolve_country("Curaçao") == "CW"
+    assert resolve_country("Turkiye") == "TR"
+
+
+def test_former_and_local_names_resolve_to_current_country():
+    names = {"Turkey": "TR", "Deutschland": "DE", "Brasil": "BR", "Burma": "MM", "Swaziland": "SZ",
+             "Zaire": "CD", "East Timor": "TL", "Upper Volta": "BF"}
+    assert {name: resolve_country(name) for name in names} == names
+
+
+def test_countries_without_a_single_successor_are_not_mapped():
+    assert resolve_country("Czechoslovakia") == ""
+    assert resolve_country("Yugoslavia") == ""
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+import hashing  # noqa: E402
+import pipeline  # noqa: E402
+from dedup import KeepLastDeduplicator  # noqa: E402
+from hashing import hashed_frame  # noqa: E402
+
+MAPPING = {'phone_col': 'Phone', 'country_col': 'Country', 'fn_col': 'First', 'ln_col': 'Last'}
+CHUNK_ROWS = 7
+
+
+@pytest.fixture(autouse=True)
+def no_digest_cache(monkeypatch):
+    monkeypatch.setattr(hashing, 'get_digest_cache', lambda: None)
+
+
+def source_frame():
+    # 40 rows over 9 phones, so repeats land in the same chunk, in neighbouring chunks and far apart.
+    rows = [{'Phone': f"07700 900{(i * 7) % 9:03d}", 'Country': 'UK' if i % 3 else 'GB',
+             'First': f"Name{i}", 'Last': f"Last{i % 4}"} for i in range(40)]
+    rows.append({'Phone': '', 'Country': 'GB', 'First': 'No', 'Last': 'Phone'})
+    rows.append({'Phone': '', 'Country': 'GB', 'First': 'Also', 'Last': 'Blank'})
+    return pd.DataFrame(rows, dtype=object)
+
+
+def expected_output(df):
+    data, hashed = pipeline.run_pipeline(df, MAPPING)
+    assert 1 < len(data) < len(df)
+    cleaned = pipeline.clean_frame(df, MAPPING)
+    assert data.equals(cleaned.drop_duplicates(subset=['phone'], keep='last'))
+    return hashed_frame(hashed)
+
+
+def streamed_output(df, tmp_path, partitions, workers=1):
+    chunks = [df.iloc[start:start + CHUNK_ROWS] for start in range(0, len(df), CHUNK_ROWS)]
+    output = tmp_path / f"out_{partitions}_{workers}.csv.gz"
+    pipeline.run_pipeline_streaming(iter(chunks), MAPPING, str(output), chunk_rows=CHUNK_ROWS,
+                                    dedup_partitions=partitions, workers=workers)
+    return pd.read_csv(output, dtype=str, keep_default_na=False)
+
+
+def test_parallel_matches_serial(monkeypatch):
+    df = source_frame()
+    expected = expected_output(df)
+    monkeypatch.setattr(pipeline, 'PARALLEL_MIN_ROWS', 10)
+    monkeypatch.setattr(pipeline, 'PARALLEL_PARTITION_ROWS', CHUNK_ROWS)
+    _, hashed = pipeline.run_pipeline(df, MAPPING, workers=2)
+    assert hashed_frame(hashed).equals(expected)
+
+
+@pytest.mark.parametrize('partitions', [1, 3, 16])
+def test_streaming_matches_drop_duplicates(tmp_path, partitions):
+    df = source_frame()
+    assert streamed_output(df, tmp_path, partitions).equals(expected_output(df))
+
+
+def test_parallel_streaming_with_spill_matches_drop_duplicates(tmp_path):
+    df = source_frame()
+    assert streamed_output(df, tmp_path, 4, workers=2).equals(expected_output(df))
+
+
+def test_keep_mask_matches_duplicated_across_partitions():
+    keys = pd.Series(['a', 'b', 'a', 'c', 'b', 'd', 'a', '', ''], dtype=object)
+    for partitions in (1, 2, 5):
+        deduplicator = KeepLastDeduplicator(partitions)
+        try:
+            for start in range(0, len(keys), 2):
+                deduplicator.add(keys.iloc[start:start + 2])
+            assert deduplicator.keep_mask().tolist() == (~keys.duplicated(keep='last')).tolist()
+        finally:
+            deduplicator.close()
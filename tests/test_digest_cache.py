@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+MODULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules')
+sys.path.insert(0, MODULES)
+
+from digest_cache import DigestCache  # noqa: E402
+
+# Each process opens a run of fresh cache files, racing the others to create and seed them.
+OPENER = r'''
+import sys
+sys.path.insert(0, sys.argv[1])
+from digest_cache import DigestCache
+for i in range(int(sys.argv[3])):
+    cache = DigestCache(f"{sys.argv[2]}/cache{i}.sqlite3")
+    cache.put_many({f"value{i}": b"digest"})
+    assert cache.get_many([f"value{i}"]) == {f"value{i}": b"digest"}
+'''
+
+
+def test_concurrent_opens_of_a_new_cache(tmp_path):
+    processes = [subprocess.Popen([sys.executable, '-c', OPENER, MODULES, str(tmp_path), '40'],
+                                  stderr=subprocess.PIPE, text=True) for _ in range(8)]
+    errors = [p.communicate()[1] for p in processes if p.wait() != 0]
+    assert errors == []
+    for i in range(40):
+        assert DigestCache(str(tmp_path / f"cache{i}.sqlite3")).stats()['entries'] == 1
+
+
+def test_evicts_least_recently_used_past_max_entries(tmp_path):
+    cache = DigestCache(str(tmp_path / 'cache.sqlite3'), max_entries=3)
+    cache.put_many({'a': b'1', 'b': b'2'})
+    cache.put_many({'c': b'3'})
+    cache.get_many(['a'])
+    cache.put_many({'d': b'4'})
+    assert set(cache.get_many(['a', 'b', 'c', 'd'])) == {'a', 'c', 'd'}
+    assert cache.stats()['entries'] == 3
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+import hashing  # noqa: E402
+from hashing import hash_columns, hash_value, hashed_frame  # noqa: E402
+
+
+def expected_frame(df):
+    return pd.DataFrame({name: [hash_value(value) for value in df[source]]
+                         for name, source in hashing.HASHED_COLUMNS.items()})
+
+
+def test_hash_columns_matches_hash_value(monkeypatch):
+    monkeypatch.setattr(hashing, 'get_digest_cache', lambda: None)
+    df = pd.DataFrame({
+        'fn': ['ann', ' Ann ', '', None, np.nan, 'bob'],
+        'ln': ['smith', 'SMITH', 'lee', '', 'x', None],
+        'phone': ['447700900123', '447700900123', '', '15551234567', None, '0'],
+    }, dtype=object)
+    assert hashed_frame(hash_columns(df)).equals(expected_frame(df))
+
+
+def test_threaded_path_matches_hash_value(monkeypatch):
+    monkeypatch.setattr(hashing, 'get_digest_cache', lambda: None)
+    rows = hashing.HASH_THREAD_THRESHOLD + 5000
+    phones = [str(447700000000 + i) for i in range(rows)]
+    df = pd.DataFrame({'fn': phones[::-1], 'ln': [''] * rows, 'phone': phones}, dtype=object)
+    assert hashed_frame(hash_columns(df, workers=4)).equals(expected_frame(df))
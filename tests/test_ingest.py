@@ -0,0 +1,30 @@
+import gzip
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+import ingest  # noqa: E402
+
+
+def test_gzip_estimate_covers_every_member(tmp_path):
+    # ISIZE only records the last member, here a single header line.
+    path = tmp_path / 'multi.csv.gz'
+    body = b"".join(b"%d,447700900%03d\n" % (i, i % 1000) for i in range(50000))
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(body))
+        f.write(gzip.compress(b"id,phone\n"))
+    assert ingest.estimated_size(str(path)) >= os.path.getsize(path) * ingest.COMPRESSION_RATIO_ESTIMATE
+
+
+def test_parquet_without_pyarrow_is_a_clear_error(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'upload.parquet'
+    pd.DataFrame({'phone': ['447700900123']}).to_parquet(path)
+    monkeypatch.setattr(ingest, 'pq', None)
+    for read in (ingest.read_header, ingest.read_preview, lambda p: ingest.read_columns_as_text(p, ['phone'])):
+        with pytest.raises(ValueError, match='pyarrow'):
+            read(str(path))
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from metrics import StageStats  # noqa: E402
+
+
+def stage(wall, cpu, rows):
+    return {'wall': wall, 'cpu': cpu, 'rows_in': rows, 'rows_out': rows, 'rss_growth_mb': None}
+
+
+def test_overlapped_worker_time_is_scaled_to_elapsed_wall_clock():
+    # Four workers spent 8s between them on two stages while the parent waited 2s.
+    stats = StageStats()
+    stats.merge_overlapped({'phone': stage(6.0, 5.0, 400), 'country': stage(2.0, 1.5, 400)}, elapsed=2.0)
+    rows = {row['stage']: row for row in stats.as_list()}
+    assert (rows['phone']['wall'], rows['country']['wall']) == (1.5, 0.5)
+    assert (rows['phone']['cpu'], rows['country']['cpu']) == (5.0, 1.5)
+    assert rows['phone']['rows_per_sec'] == 400 / 1.5
+
+
+def test_overlapped_merge_adds_to_stages_timed_in_the_parent():
+    stats = StageStats()
+    stats.record('phone', 1.0, 1.0, 100, 100)
+    stats.merge_overlapped({'phone': stage(3.0, 3.0, 300)}, elapsed=1.0)
+    assert stats.stages['phone']['wall'] == 2.0
+    assert stats.stages['phone']['rows_in'] == 400
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from names import normalize_name, normalize_name_column  # noqa: E402
+
+NAMES = ["José", "  Mary-Jane ", "O'Brien", "ZOË", "van der Berg", "Łukasz", "李", "", None, np.nan, 42, "José"]
+
+
+def test_column_matches_scalar_normalize_name():
+    series = pd.Series(NAMES, dtype=object)
+    assert normalize_name_column(series).tolist() == [normalize_name(name) for name in NAMES]
+
+
+def test_column_keeps_the_index():
+    series = pd.Series(["Ann", "Bob"], index=[10, 3], dtype=object)
+    assert normalize_name_column(series).index.tolist() == [10, 3]
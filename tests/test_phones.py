@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from phones import normalize_phone_column  # noqa: E402
+
+
+def normalize(numbers, iso_codes):
+    return normalize_phone_column(pd.Series(numbers, dtype=object), pd.Series(iso_codes, dtype=object)).tolist()
+
+
+def test_foreign_number_dialed_with_international_prefix_keeps_its_country_code():
+    assert normalize(["011 44 7700 900123", "0044 7700 900123"], ["US", "IN"]) == ["+447700900123",
+                                                                                   "+447700900123"]
+
+
+def test_home_number_dialed_with_international_prefix():
+    assert normalize(["0091 98765 43210", "011 1 202 555 0123"], ["IN", "US"]) == ["+919876543210", "+12025550123"]
+
+
+def test_national_numbers_are_unchanged():
+    assert normalize(["098765 43210", "(202) 555-0123", "+44 7700 900123", ""], ["IN", "US", "US", "US"]) == [
+        "+919876543210", "+12025550123", "+447700900123", ""]
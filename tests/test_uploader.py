@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+
+import pytest
+import requests
+
+pytest.importorskip('facebook_business')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+import uploader  # noqa: E402
+from uploader import upload_in_batches  # noqa: E402
+
+SCHEMA = ['FN', 'LN', 'PHONE']
+ROWS = [(f"fn{i}", f"ln{i}", f"phone{i}") for i in range(25)]
+
+
+class FakeCreateUsers:
+    """Stands in for audience.create_user, recording every call's session block."""
+
+    def __init__(self, fail_seqs=(), flaky_seqs=()):
+        self.fail_seqs = set(fail_seqs)
+        self.flaky_seqs = set(flaky_seqs)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, params):
+        seq = params['session']['batch_seq']
+        with self.lock:
+            self.calls.append(params['session'])
+            if seq in self.flaky_seqs:
+                self.flaky_seqs.discard(seq)
+                raise requests.ConnectionError("connection reset")
+        if seq in self.fail_seqs:
+            raise ValueError("invalid payload")
+        return {'num_received': len(params['payload']['data']), 'num_invalid_entries': 0}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(uploader, 'backoff_delay', lambda attempt: 0)
+
+
+def test_batches_share_a_session_and_only_the_last_closes_it():
+    send = FakeCreateUsers()
+    report = upload_in_batches(send, SCHEMA, ROWS, batch_rows=10, workers=2)
+
+    assert len({call['session_id'] for call in send.calls}) == 1
+    assert sorted(call['batch_seq'] for call in send.calls) == [1, 2, 3]
+    assert [call['batch_seq'] for call in send.calls if call['last_batch_flag']] == [3]
+    assert send.calls[-1]['batch_seq'] == 3
+    assert report['num_received'] == 25
+    assert sorted(report['accepted']) == sorted(ROWS)
+    assert report['failed'] == []
+
+
+def test_last_batch_is_held_back_when_an_earlier_one_fails():
+    send = FakeCreateUsers(fail_seqs={2})
+    report = upload_in_batches(send, SCHEMA, ROWS, batch_rows=10, workers=2)
+
+    assert 3 not in [call['batch_seq'] for call in send.calls]
+    assert [failure['batch_seq'] for failure in report['failed']] == [2, 3]
+    assert report['accepted'] == ROWS[:10]
+
+
+def test_transient_errors_are_retried_in_the_same_session():
+    send = FakeCreateUsers(flaky_seqs={1})
+    report = upload_in_batches(send, SCHEMA, ROWS, batch_rows=10, workers=2)
+
+    assert [call['batch_seq'] for call in send.calls].count(1) == 2
+    assert len({call['session_id'] for call in send.calls}) == 1
+    assert report['failed'] == []